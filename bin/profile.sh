@@ -0,0 +1,8 @@
+#!/usr/bin/env bash
+# ./profile.sh <exchange> [seconds]
+
+cd ..
+APPHOME=`pwd`
+
+mkdir -p ${APPHOME}/logs
+echo "${2:-}" > ${APPHOME}/logs/.profile.$1
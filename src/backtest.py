@@ -0,0 +1,468 @@
+import json
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from bisect import bisect_right
+from .functions import *
+from .functions import oltp  # not exported yet (see its "todo").
+from .plugins import *  # Appears as unused in PyCharm, but simply ignore that.
+
+
+class Recorder(object):
+    """
+    Saves what a (live) Wrapper sees every 'interval' seconds: symbols, summaries, and the trades history and
+    order book of each BTC symbol (and its OHLCV, if 'ohlcv' is True), to be replayed later on by 'Playback'.
+
+    Each snapshot is a pickled dictionary, preceded by a (timestamp, size) header: the file can be indexed
+    without unpickling anything, and appended to by another recording session.
+    """
+
+    Header = struct.Struct('<dI')
+
+    def __init__(self, wrapper, fqfn, interval=60., margin=5, ohlcv=False):
+        """
+        Constructor method.
+        """
+
+        self.Wrapper = wrapper
+        self.Brand = self.Wrapper.Brand
+        self.FQFN = fqfn
+        self.Interval, self.Margin, self.OHLCV = interval, margin, ohlcv
+
+        self.Toolkit = self.Wrapper.Toolkit
+        self.log = self.Toolkit.log
+        self.log(self.Toolkit.Greeting, self)
+
+    def run(self, minutes=60.):
+        """
+        Keeps recording for 'minutes' (or until the system is halted).
+        """
+
+        try:
+            deadline, c = time.time() + 60 * minutes, 0
+            while time.time() < deadline and not self.Toolkit.halt():
+                t_delta = time.time()
+                if self.snapshot() is not None:
+                    c += 1
+                t_delta = time.time() - t_delta
+                self.log('Snapshot # {0} recorded in {1:.8f} seconds.'.format(c, t_delta), self)
+                self.Toolkit.sleep(max(0., self.Interval - t_delta))
+            return c
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def snapshot(self):
+        """
+        """
+
+        try:
+            now = time.time()
+            symbols = self.Wrapper.symbols(btc_only=False)
+            assert symbols is not None
+            summaries = self.Wrapper.summaries(btc_only=False)
+            assert summaries is not None
+
+            tmp = {'brand': self.Brand, 'fee': self.Wrapper.Fee, 'symbols': symbols, 'summaries': summaries,
+                   'history': {}, 'book': {}, 'ohlcv': {}}
+            for s in sorted(symbols):
+                if self.Toolkit.halt():
+                    return
+                if s[1] != 'btc':
+                    continue
+
+                history = self.Wrapper.history(s)
+                if history is not None:
+                    tmp['history'][s] = history
+                book = self.Wrapper.book(s, self.Margin)
+                if book is not None:
+                    asks, _, bids, _ = book.arrays()
+                    tmp['book'][s] = book.asks(asks[0], asks[-1]), book.bids(bids[0], bids[-1])
+                if self.OHLCV:
+                    ohlcv = self.Wrapper.ohlcv(s)
+                    if ohlcv is not None:
+                        tmp['ohlcv'][s] = ohlcv
+
+            data = pickle.dumps(tmp, pickle.HIGHEST_PROTOCOL)
+            os.makedirs(os.path.dirname(os.path.abspath(self.FQFN)), exist_ok=True)
+            with open(self.FQFN, 'ab') as fp:
+                fp.write(self.Header.pack(now, len(data)) + data)
+            return now
+
+        except AssertionError:
+            return
+        except:
+            self.log(traceback.format_exc(), self)
+
+
+class Clock(object):
+    """
+    https://en.wikipedia.org/wiki/Discrete-event_simulation
+
+    The simulated time (see 'Toolkit.clock()' and 'Toolkit.sleep()'): it only moves forward when someone
+    would sleep, and halts the system (just the 'Stop' event: no HALT file) once it's past 'end'.
+    """
+
+    def __init__(self, toolkit, start, end):
+        """
+        Constructor method.
+        """
+
+        self.Toolkit = toolkit
+        self.Start, self.End = start, end
+        self._now = start
+
+    def now(self):
+        """
+        """
+
+        return self._now
+
+    def advance(self, seconds):
+        """
+        """
+
+        self._now += max(0., seconds)
+        if self._now > self.End:
+            self.Toolkit.Stop.set()
+
+
+class Playback(object):
+    """
+    A Wrapper serving the snapshots of a 'Recorder' file (the latest one by the simulated clock), and
+    a simulated account for the trading methods, which starts with 'funds' bitcoins.
+
+    Fill model: orders are never partially filled, always at their own price (paying the usual fee),
+    as soon as the book crosses them (even when they're placed) or a trade goes through their price.
+    """
+
+    def __init__(self, toolkit, fqfn, funds=.1):
+        """
+        Constructor method.
+        """
+
+        self.Toolkit = toolkit
+        self.log = self.Toolkit.log
+        self.FQFN = fqfn
+
+        self._index = self._scan()
+        assert len(self._index) > 0
+        self.Times = [t for t, _, _ in self._index]
+        self.Start, self.End = self.Times[0], self.Times[-1]
+
+        self._current, self._snapshot, self._books = None, None, {}
+        first = self._load(0)
+        self.Brand, self.Fee = first['brand'] + '_backtest', first['fee']
+
+        self._balance = {'btc': [funds, 0.]}
+        self._orders, self._sequence = {}, 0
+        self._lock = threading.RLock()  # the Advisor scans with many threads (see 'scan_workers').
+        self.Fills, self.Cancelled, self.Rejected = [], 0, 0
+
+    def symbols(self, btc_only=True):
+        """
+        """
+
+        with self._lock:
+            tmp = self._latest()['symbols']
+            if btc_only:
+                return {s for s in tmp if s[1] == 'btc'}
+            return set(tmp)
+
+    def ohlcv(self, symbol):
+        """
+        """
+
+        with self._lock:
+            return self._latest()['ohlcv'].get(symbol)
+
+    def summaries(self, btc_only=True):
+        """
+        """
+
+        with self._lock:
+            tmp = self._latest()['summaries']
+            if btc_only:
+                return {s: v for s, v in tmp.items() if s[1] == 'btc'}
+            return dict(tmp)
+
+    def history(self, symbol, limit=100):
+        """
+        """
+
+        with self._lock:
+            tmp = self._latest()['history'].get(symbol)
+            if tmp is not None:
+                return tmp[-limit:]
+
+    def book(self, symbol, margin=1):
+        """
+        """
+
+        with self._lock:
+            self._latest()
+            if symbol not in self._books:
+                if symbol not in self._snapshot['book']:
+                    return
+                self._books[symbol] = ctrl.OrderBook.from_sides(*self._snapshot['book'][symbol])
+            return self._books[symbol].window(margin)
+
+    def balance(self):
+        """
+        """
+
+        with self._lock:
+            self._match()
+            return {c: (available, on_orders) for c, (available, on_orders) in self._balance.items()
+                    if c == 'btc' or available + on_orders > 1E-12}
+
+    def fire(self, amount, price, symbol, simulate=False):
+        """
+        """
+
+        with self._lock:
+            try:
+                if simulate:
+                    return price, amount
+
+                base, quote = symbol
+                currency, value = [(base, -amount), (quote, amount * price)][amount > 0]
+                funds = self._balance.setdefault(currency, [0., 0.])
+                assert 0 < value <= funds[0] + 1E-8
+                value = min(value, funds[0])  # just rounding (to 8 decimals), like the sites' own lot sizes.
+                amount = [-value, value / price][amount > 0]
+
+                funds[0] -= value
+                funds[1] += value
+                self._sequence += 1
+                oid = self._sequence
+                self._orders[oid] = {'amount': amount, 'price': price, 'symbol': symbol,
+                                     'placed': self.Toolkit.clock(), 'state': 'open'}
+                self._match()
+                return oid, price, amount
+
+            except AssertionError:
+                self.Rejected += 1
+                self.log('Order rejected (insufficient funds): {0} {1} @ {2:.8f}'.format(symbol, amount, price), self)
+            except:
+                self.log(traceback.format_exc(), self)
+
+    def orders(self):
+        """
+        """
+
+        with self._lock:
+            self._match()
+            return {oid: (o['amount'], o['price'], o['symbol']) for oid, o in self._orders.items()
+                    if o['state'] == 'open'}
+
+    def status(self, order_id):
+        """
+        """
+
+        with self._lock:
+            self._match()
+            if order_id in self._orders:
+                o = self._orders[order_id]
+                return o['state'], [0., abs(o['amount'])][o['state'] == 'filled']
+
+    def cancel(self, order_id):
+        """
+        """
+
+        with self._lock:
+            self._match()
+            o = self._orders.get(order_id)
+            if o is None or o['state'] != 'open':
+                return 0
+
+            base, quote = o['symbol']
+            currency, value = [(base, -o['amount']), (quote, o['amount'] * o['price'])][o['amount'] > 0]
+            self._balance[currency][0] += value
+            self._balance[currency][1] -= value
+            o['state'] = 'cancelled'
+            self.Cancelled += 1
+            return '-' + str(order_id).upper()
+
+    def _match(self):
+        """
+        Fills every open order crossed by the current book or by any trade since it was placed.
+        """
+
+        now, snapshot = self.Toolkit.clock(), self._latest()
+        for oid, o in self._orders.items():
+            if o['state'] != 'open':
+                continue
+
+            amount, price, symbol = o['amount'], o['price'], o['symbol']
+            book = self.book(symbol)
+            best = None if book is None else book.best()
+            trades = [p for t, _, p in snapshot['history'].get(symbol, []) if o['placed'] < t <= now]
+
+            if amount > 0:
+                crossed = (best is not None and best[0] <= price) or any(p < price for p in trades)
+            else:
+                crossed = (best is not None and best[1] >= price) or any(p > price for p in trades)
+            if not crossed:
+                continue
+
+            base, quote = symbol
+            fee = 1 - self.Fee / 100
+            for c in symbol:
+                self._balance.setdefault(c, [0., 0.])
+            if amount > 0:
+                self._balance[quote][1] -= amount * price
+                self._balance[base][0] += fee * amount
+            else:
+                self._balance[base][1] += amount
+                self._balance[quote][0] -= fee * amount * price
+            o['state'] = 'filled'
+            self.Fills.append(now - o['placed'])
+
+    def _latest(self):
+        """
+        The latest snapshot by the simulated clock (the first one, before it starts).
+        """
+
+        i = max(0, bisect_right(self.Times, self.Toolkit.clock()) - 1)
+        if i != self._current:
+            self._snapshot, self._books = self._load(i), {}
+            self._current = i
+        return self._snapshot
+
+    def _load(self, i):
+        """
+        """
+
+        _, offset, size = self._index[i]
+        with open(self.FQFN, 'rb') as fp:
+            fp.seek(offset)
+            return pickle.loads(fp.read(size))
+
+    def _scan(self):
+        """
+        [(timestamp, offset, size)] of every (complete) snapshot in the file, by their headers only.
+        """
+
+        tmp, header = [], Recorder.Header
+        with open(self.FQFN, 'rb') as fp:
+            total = os.fstat(fp.fileno()).st_size
+            while True:
+                chunk = fp.read(header.size)
+                if len(chunk) < header.size:
+                    break
+                stamp, size = header.unpack(chunk)
+                offset = fp.tell()
+                if offset + size > total:
+                    break  # still being written (or interrupted)
+                tmp.append((stamp, offset, size))
+                fp.seek(size, os.SEEK_CUR)
+        return sorted(tmp)
+
+
+def percentile(values, p):
+    """
+    """
+
+    if len(values) == 0:
+        return 0.
+    tmp = sorted(values)
+    return tmp[min(len(tmp) - 1, int(p / 100 * len(tmp)))]
+
+
+def backtest(toolkit, fqfn, trade=False, funds=.1):
+    """
+    Replays a recording through 'Advisor.broadway()' (or the whole 'Trader.probe()', if 'trade' is True)
+    as fast as possible, then reports the analysis latencies (real seconds), the orders and their fill
+    latencies (simulated seconds), and the PnL; also saved to '/logs/backtest.<brand>.json'.
+
+    Its state (see 'Toolkit.Data') lives in a temporary folder: never mixed up with the live one.
+    """
+
+    data = tempfile.TemporaryDirectory(prefix='backtest.')
+    try:
+        playback = Playback(toolkit, fqfn, funds)
+        toolkit.Clock = Clock(toolkit, playback.Start, playback.End)
+        toolkit.Data = data.name + '/'
+        toolkit.Metrics.Name = playback.Brand
+        toolkit.log('Replaying {0} snapshots ({1:.2f} hours) of {2}...'.format(
+            len(playback.Times), (playback.End - playback.Start) / 3600, fqfn), playback)
+
+        advisor = olap.Advisor(dbms.Database(playback))
+        before = oltp.Oracle(playback).value(playback.balance())
+
+        cycles, selections, broadway = [], [], advisor.broadway
+
+        def timed_broadway():
+            t_delta = time.perf_counter()
+            try:
+                result = broadway()
+                selections.append((toolkit.clock(), result))
+                return result
+            finally:
+                cycles.append(time.perf_counter() - t_delta)
+
+        advisor.broadway = timed_broadway
+        started = time.time()
+        if trade:
+            oltp.Trader(advisor).probe()
+        else:
+            while not toolkit.halt():
+                advisor.broadway()
+                toolkit.wait()
+        wall = time.time() - started
+
+        after = oltp.Oracle(playback).value(playback.balance())
+        value = [[sum(v[i] for v in h.values()) if h is not None else None for i in range(2)]
+                 for h in (before, after)]
+        report = {
+            'recording': fqfn,
+            'snapshots': len(playback.Times),
+            'simulated_seconds': toolkit.clock() - playback.Start,
+            'wall_seconds': wall,
+            'speedup': (toolkit.clock() - playback.Start) / max(wall, 1E-9),
+            'cycles': len(cycles),
+            'cycle_seconds': {'p50': percentile(cycles, 50), 'p99': percentile(cycles, 99),
+                              'max': max(cycles, default=0.)},
+            'selections': sum(1 for _, s in selections if s),
+            'orders': {'fired': playback._sequence, 'filled': len(playback.Fills),
+                       'cancelled': playback.Cancelled, 'rejected': playback.Rejected},
+            'fill_seconds': {'p50': percentile(playback.Fills, 50), 'p99': percentile(playback.Fills, 99)},
+            'value_btc': [value[0][0], value[1][0]],
+            'value_usd': [value[0][1], value[1][1]],
+            'balance': playback.balance(),
+        }
+        if None not in report['value_btc']:
+            report['pnl_btc'] = value[1][0] - value[0][0]
+            report['pnl_pct'] = 100 * (value[1][0] / value[0][0] - 1) if value[0][0] > 0 else None
+
+        toolkit.log('BACKTEST report: {}', playback, args=(report,))
+        path = toolkit.Path + '/logs/'
+        os.makedirs(path, exist_ok=True)
+        with open(path + 'backtest.' + playback.Brand + '.json', 'w') as fp:
+            json.dump(report, fp, indent=2, default=str)
+        return report
+
+    except:
+        toolkit.log(traceback.format_exc())
+    finally:
+        data.cleanup()
+
+
+if __name__ == '__main__':
+    # python -m src.backtest APPHOME record <brand> <file> [minutes]
+    # python -m src.backtest APPHOME run <file> [trade]
+    tlk = ctrl.Toolkit(sys.argv[1])
+    if sys.argv[2] == 'record':
+        wrapper = [plg for plg in tlk.Plugins if plg.Brand == sys.argv[3]][0]
+        tlk.watch()
+        Recorder(wrapper, sys.argv[4]).run(float(sys.argv[5]) if len(sys.argv) > 5 else 60.)
+    else:
+        print(json.dumps(backtest(tlk, sys.argv[3], len(sys.argv) > 4 and sys.argv[4] == 'trade'),
+                         indent=2, default=str))
+    tlk.flush()
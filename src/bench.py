@@ -0,0 +1,328 @@
+import gc
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from .functions import *
+from .plugins import binance, bittrex, poloniex
+
+
+class Stub(object):
+    """
+    A fake Wrapper, serving synthetic (but reproducible) market data instead of downloading anything.
+    """
+
+    def __init__(self, toolkit, size=100, levels=100, seed=0):
+        """
+        Constructor method.
+        """
+
+        self.Brand, self.Fee = 'bench', .1
+
+        self.Toolkit = toolkit
+        self.log = self.Toolkit.log
+
+        rnd = random.Random(seed)
+        now = int(time.time())
+        self.Histories, self.Books = {}, {}
+
+        for i in range(size):
+            s = 'sym{}'.format(i), 'btc'
+            mid = rnd.uniform(1E-6, 1E-1)
+            span = rnd.choice([60, 600, 3600, 36000])
+            self.Histories[s] = sorted([(now - rnd.randrange(span), rnd.choice([-1, 1]) * rnd.uniform(1, 1E3),
+                                         mid * rnd.uniform(.99, 1.01)) for _ in range(100)])
+
+            skew = rnd.uniform(.5, 2)
+            asks = [(mid * (1 + rnd.uniform(1E-4, .05)), rnd.uniform(1, 1E3)) for _ in range(levels)]
+            bids = [(mid * (1 - rnd.uniform(1E-4, .05)), skew * rnd.uniform(1, 1E3)) for _ in range(levels)]
+            self.Books[s] = ctrl.OrderBook.from_sides(asks, bids)
+
+    def symbols(self, btc_only=True):
+        """
+        """
+
+        return set(self.Histories)
+
+    def history(self, symbol, limit=100):
+        """
+        """
+
+        return self.Histories[symbol][-limit:]
+
+    def book(self, symbol, margin=1):
+        """
+        """
+
+        return self.Books[symbol].window(margin)
+
+
+def timed(func, *args, repeat=3):
+    """
+    Best wall time (in seconds) of 'repeat' runs, and the result of the last one.
+    """
+
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        t_delta = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t_delta)
+    return best, result
+
+
+def measure(name, size, func, repeat=5, budget=.05):
+    """
+    Operations per second (the best of 'repeat' rounds, each one long enough to take about 'budget' seconds)
+    and, from a single separate call traced by 'tracemalloc', the memory blocks allocated (and still alive
+    right after it: results included) and the peak of traced memory.
+    """
+
+    func()  # warming up (caches, lazy imports...)
+    number, elapsed = 1, 0.
+    while True:
+        elapsed, _ = timed(lambda: [func() for _ in range(number)], repeat=1)
+        if elapsed >= budget or number >= 1E6:
+            break
+        number *= 10 if elapsed < budget / 10 else 2
+
+    best = min([elapsed] + [timed(lambda: [func() for _ in range(number)], repeat=1)[0] for _ in range(repeat - 1)])
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del result
+
+    blocks = sum(max(0, s.count_diff) for s in after.compare_to(before, 'traceback'))
+    tmp = {'name': name, 'size': size, 'ops_per_second': number / best, 'seconds_per_op': best / number,
+           'allocated_blocks': blocks, 'peak_bytes': peak}
+    print('{name:<28} {size:>7} | {ops_per_second:>14,.1f} ops/s | {seconds_per_op:.3e} s/op | '
+          '{allocated_blocks:>8} blocks | {peak_bytes:>11,} peak bytes'.format(**tmp))
+    return tmp
+
+
+def tickers(toolkit, sizes=(10, 100, 1000, 10000)):
+    """
+    'Toolkit.ticker()' for books of 'sizes' levels (each side).
+    """
+
+    results = []
+    for size in sizes:
+        book = Stub(toolkit, 1, size).Books[('sym0', 'btc')]
+        results.append(measure('Toolkit.ticker', size, lambda: toolkit.ticker(book)))
+    return results
+
+
+def smoothing(toolkit, sizes=(1, 1000)):
+    """
+    'Toolkit.smooth()' (both flavors) over 'sizes' values at a time.
+    """
+
+    results = []
+    for size in sizes:
+        rnd = random.Random(size)
+        values = [rnd.uniform(-1E6, 1E6) for _ in range(size)]
+        for sigmoid in [False, True]:
+            results.append(measure('Toolkit.smooth' + ['', '(sigmoid)'][sigmoid], size,
+                                   lambda: [toolkit.smooth(v, sigmoid) for v in values]))
+    return results
+
+
+def indexing(toolkit, sizes=(10, 100, 1000)):
+    """
+    'Advisor._index()' of a single symbol, whose books have 'sizes' levels (each side).
+    """
+
+    results = []
+    for size in sizes:
+        advisor = olap.Advisor(dbms.Database(Stub(toolkit, 10, size)))
+        symbols = itertools.cycle(sorted(advisor.Wrapper.symbols()))  # one of them each time.
+        results.append(measure('Advisor._index', size, lambda: advisor._index(next(symbols))))
+    return results
+
+
+def selection(toolkit, sizes=(100, 1000, 10000)):
+    """
+    'Advisor.broadway()' selection over 'sizes' symbols already scored (no analysis at all).
+    """
+
+    results = []
+    for size in sizes:
+        rnd = random.Random(size)
+        stub = Stub(toolkit, 0)
+        stub.Histories = {('sym{}'.format(i), 'btc'): None for i in range(size)}
+
+        advisor = olap.Advisor(dbms.Database(stub))
+        advisor._cache = {'data': {s: rnd.uniform(-20, 30) for s in stub.Histories}}
+        advisor._update = lambda symbols: None
+        results.append(measure('Advisor.broadway', size, advisor.broadway))
+    return results
+
+
+def persistence(toolkit, sizes=(100, 1000, 10000)):
+    """
+    'Database.query()' writing a state of 'sizes' keys (1 % of them changed every time), and reading it
+    back (either cached or not).
+    """
+
+    class Account(object):
+        pass
+
+    results = []
+    for size in sizes:
+        rnd = random.Random(size)
+        database = dbms.Database(Stub(toolkit, 0))
+        account = Account()
+        state = {'data': {('sym{}'.format(i), 'btc'): rnd.uniform(-20, 30) for i in range(size)},
+                 'scored': {('sym{}'.format(i), 'btc'): time.time() for i in range(size)}, 'last': time.time()}
+        database.query(account, state)
+        keys = list(state['data'])
+
+        def write():
+            for s in rnd.sample(keys, max(1, size // 100)):
+                state['data'][s] = rnd.uniform(-20, 30)
+            database.query(account, state)
+
+        def uncached():
+            database._cache.clear()
+            return database.query(account)
+
+        results.append(measure('Database.query(write)', size, write))
+        results.append(measure('Database.query(read)', size, lambda: database.query(account)))
+        results.append(measure('Database.query(read,cold)', size, uncached))
+    return results
+
+
+def parsing(toolkit, sizes=(100, 1000)):
+    """
+    Books and trades histories (of 'sizes' levels / trades) parsed by each plugin, from canned responses
+    in each site's own format (exactly as 'json.loads()' would give them).
+    """
+
+    rnd, now = random.Random(0), int(time.time())
+    results = []
+    for size in sizes:
+        asks = sorted((rnd.uniform(1.0, 1.1), rnd.uniform(1, 1E3)) for _ in range(size))
+        bids = sorted(((rnd.uniform(.9, 1.0), rnd.uniform(1, 1E3)) for _ in range(size)), reverse=True)
+        trades = [(i, now - size + i, rnd.uniform(1, 1E3), rnd.uniform(.9, 1.1), rnd.random() < .5)
+                  for i in range(size)]
+
+        canned = {
+            binance: (
+                {'lastUpdateId': 1, 'asks': [['{:.8f}'.format(p), '{:.8f}'.format(a)] for p, a in asks],
+                 'bids': [['{:.8f}'.format(p), '{:.8f}'.format(a)] for p, a in bids]},
+                [{'id': i, 'price': '{:.8f}'.format(p), 'qty': '{:.8f}'.format(a), 'time': 1000 * t,
+                  'isBuyerMaker': m} for i, t, a, p, m in trades]),
+            bittrex: (
+                {'success': True, 'result': {'sell': [{'Rate': p, 'Quantity': a} for p, a in asks],
+                                             'buy': [{'Rate': p, 'Quantity': a} for p, a in bids]}},
+                {'success': True, 'result': [
+                    {'Id': i, 'Quantity': a, 'Price': p, 'OrderType': ['BUY', 'SELL'][m],
+                     'TimeStamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t)) + '.000'}
+                    for i, t, a, p, m in reversed(trades)]}),
+            poloniex: (
+                {'asks': [['{:.8f}'.format(p), a] for p, a in asks], 'bids': [['{:.8f}'.format(p), a] for p, a in bids],
+                 'isFrozen': '0'},
+                [{'tradeID': i, 'rate': '{:.8f}'.format(p), 'amount': '{:.8f}'.format(a), 'type': ['buy', 'sell'][m],
+                  'date': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(t))} for i, t, a, p, m in reversed(trades)]),
+        }
+
+        for module, (book, history) in canned.items():
+            wrapper = module.Wrapper(toolkit)
+            responses = {'book': book, 'history': history}
+            wrapper._request = lambda req_uri, *args, **kwargs: responses[current]
+
+            def parse_history():
+                wrapper._trades.clear()  # always the first download, not the (shorter) incremental ones.
+                return wrapper.history(('sym0', 'btc'), size)
+
+            current = 'book'
+            results.append(measure(module.__name__.split('.')[-1] + '.book', size,
+                                   lambda: wrapper.book(('sym0', 'btc'), 100)))
+            current = 'history'
+            results.append(measure(module.__name__.split('.')[-1] + '.history', size, parse_history))
+    return results
+
+
+def batch_scoring(toolkit, sizes=(10, 100, 1000)):
+    """
+    Scalar ('Advisor._index()' for each symbol) versus batch ('Toolkit.indexes()') scoring.
+    """
+
+    for size in sizes:
+        stub = Stub(toolkit, size)
+        advisor = olap.Advisor(dbms.Database(stub))
+        symbols = sorted(stub.symbols())
+
+        def scalar():
+            return [advisor._index(s) for s in symbols]
+
+        def batch():
+            histories = [stub.history(s) for s in symbols]
+            books = [stub.book(s, 5) for s in symbols]
+            return list(toolkit.indexes(histories, books, 5)['score'])
+
+        t_scalar, r_scalar = timed(scalar)
+        t_batch, r_batch = timed(batch)
+
+        print('batch_scoring: {:>6} symbols | scalar {:.6f} s | batch {:.6f} s | speedup {:.2f}x | '
+              'identical results: {}'.format(size, t_scalar, t_batch, t_scalar / t_batch, r_scalar == r_batch))
+
+
+def compare(results, baseline):
+    """
+    Prints the change (in ops/s) of every result also found in a 'baseline' (a previous run's JSON file).
+    """
+
+    with open(baseline) as fp:
+        previous = {(r['name'], r['size']): r for r in json.load(fp)['results']}
+
+    for r in results:
+        old = previous.get((r['name'], r['size']))
+        if old is not None:
+            change = 100 * (r['ops_per_second'] / old['ops_per_second'] - 1)
+            print('{0:<28} {1:>7} | {2:+8.2f} % ops/s | {3:+d} blocks'.format(
+                r['name'], r['size'], change, r['allocated_blocks'] - old['allocated_blocks']))
+
+
+def sandbox(home, path):
+    """
+    A Toolkit living at 'path' (a temporary folder), with the settings of 'home': whatever the benchmarks
+    write (databases, trades, logs, metrics) never gets mixed up with a real installation.
+    """
+
+    os.makedirs(path + '/bin', exist_ok=True)
+    if os.path.exists(home + '/bin/conf.ini'):
+        shutil.copy(home + '/bin/conf.ini', path + '/bin/conf.ini')
+    return ctrl.Toolkit(path)
+
+
+if __name__ == '__main__':
+    # python -m src.bench [APPHOME [results.json [baseline.json]]]
+    with tempfile.TemporaryDirectory(prefix='bench.') as tmp:
+        tlk = sandbox(sys.argv[1] if len(sys.argv) > 1 else '.', tmp)
+        print('(NumPy is {}available.)'.format(['NOT ', ''][ctrl.numpy is not None]))
+
+        report = []
+        for suite in [tickers, smoothing, indexing, selection, persistence, parsing]:
+            report += suite(tlk)
+        batch_scoring(tlk)
+
+        if len(sys.argv) > 2:
+            with open(sys.argv[2], 'w') as f:
+                json.dump({'time': time.time(), 'python': sys.version, 'numpy': ctrl.numpy is not None,
+                           'results': report}, f, indent=2)
+        if len(sys.argv) > 3:
+            compare(report, sys.argv[3])
+        tlk.flush()
@@ -1,6 +1,6 @@
 #todo
 
-#__all__ = ['ctrl', 'dbms', 'olap', 'oltp', ]
-__all__ = ['ctrl', 'dbms', 'olap', ]
+#__all__ = ['ctrl', 'dbms', 'ipcs', 'jrnl', 'mtrc', 'netw', 'olap', 'oltp', 'prof', 'tsdb', ]
+__all__ = ['ctrl', 'dbms', 'ipcs', 'jrnl', 'mtrc', 'netw', 'olap', 'prof', 'tsdb', ]
 
 __author__ = 'developer@kebnekaise.io'
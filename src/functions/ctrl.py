@@ -1,14 +1,35 @@
-import inspect
+import asyncio
+import ctypes
+import ctypes.util
 import math
+import multiprocessing
 import os
 import random
+import signal
+import struct
 import sys
+import threading
 import time
 import traceback
 
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping, MutableMapping
 from configparser import ConfigParser
+from heapq import merge
+from itertools import chain
+from operator import itemgetter
 from os.path import dirname, exists
 
+from .jrnl import Journal
+from .mtrc import Registry
+from .netw import Transport
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class Toolkit(object):
     """
@@ -21,24 +42,40 @@ class Toolkit(object):
         """
 
         self.Path = path
+        self.Data = self.Path + '/data/'  # the persistent state (see 'dbms' and 'tsdb'), a backtest keeps its own.
+        self.Journal = None
+        self._components = {}
         self.CParser = ConfigParser(allow_no_value=True)
         self.CParser.read(self.Path + '/bin/conf.ini')
+        self.Transport = Transport(float(self.setup().get('connect_timeout', 5)),
+                                   float(self.setup().get('read_timeout', 15)),
+                                   int(self.setup().get('pool_size', 8)))
+        if self.setup().get('logging', 'sync').lower() == 'async':
+            self.Journal = Journal(self.Path + '/logs/', int(self.setup().get('log_queue', 10000)),
+                                   int(self.setup().get('log_truncate', 4096)))
+        self.Metrics = Registry(self, float(self.setup().get('metrics_interval', 60)))
         self.Plugins = self._plugins()
         self.Quota = 0.003  # bitcoins
+        self.Bus = None  # see 'ipcs.Bus', it's set by the control process (if any).
 
         self.Phi = (1 + 5 ** .5) / 2  # https://en.wikipedia.org/wiki/Golden_ratio
         self.Greeting = 'This component was successfully started.'
-        self._halted = False
+        self.Stop = multiprocessing.Event()  # shared by every process forked from here on.
+        self.Clock = None  # a simulated one (see 'src/backtest.py') replaces the real time, if given.
+        self._halted, self._watching = False, None
 
-    def setup(self, brand=None):
+    def setup(self, brand=None, option=None, fallback=None):
         """
         Read settings at '/bin/conf.ini' and retrieve it
         from [DEFAULT] or [PLUGIN_NAME] section
+        (or just a single 'option' of the latter, if it's given).
         """
 
         try:
             if brand is None:
                 return dict(self.CParser.defaults())
+            elif option is not None:
+                return self.CParser.get(brand.upper(), option, fallback=fallback)
             else:
                 plg = brand.upper()
                 key = self.CParser.get(plg, 'key')
@@ -54,18 +91,17 @@ class Toolkit(object):
 
         try:
             assert orders_book is not None
+            if not isinstance(orders_book, OrderBook):
+                orders_book = OrderBook(orders_book)
+
+            best = orders_book.best()
+            assert best is not None
 
-            l_ask = min(price for price, amount in orders_book.items() if amount > 0)
-            h_bid = max(price for price in orders_book if price < l_ask)
+            l_ask, h_bid = best
             h_ask, l_bid = (1 + depth / 100) * l_ask, (1 - depth / 100) * h_bid
 
-            notionals = {'asks': [], 'bids': []}
-            for price, amount in sorted(orders_book.items()):
-                if l_bid <= price <= h_ask:
-                    if amount > 0:
-                        notionals['asks'].append(price * amount)
-                    else:
-                        notionals['bids'].append(price * -amount)
+            notionals = {'asks': [price * amount for price, amount in orders_book.asks(l_bid, h_ask)],
+                         'bids': [price * amount for price, amount in orders_book.bids(l_bid, h_ask)]}
 
             l_ask_weight = int(notionals['asks'][0] / self.Quota)
             h_bid_weight = int(notionals['bids'][-1] / self.Quota)
@@ -77,6 +113,48 @@ class Toolkit(object):
         except:
             self.log(traceback.format_exc())
 
+    def indexes(self, histories, books, depth=3):
+        """
+        The same quantities of 'Advisor._index()' (and 'ticker()' / 'smooth()' inside it), but for many
+        symbols at once: the i-th history and book belong to the i-th symbol (None means missing data).
+        Returns a dictionary of arrays (lists, if NumPy is not available) with exactly the same results.
+        """
+
+        try:
+            if numpy is None:
+                return self._indexes(histories, books, depth)
+
+            np, n = numpy, len(histories)
+            nan = np.full(n, np.nan)
+            tmp = dict.fromkeys(['l_ask', 'h_bid', 'l_ask_weight', 'h_bid_weight', 'buy_pressure', 'spread'], nan)
+
+            counts = np.array([len(h or []) for h in histories])
+            epochs = np.zeros((n, max(1, counts.max(initial=0))), dtype=np.int64)
+            filled = np.arange(epochs.shape[1]) < counts[:, None]
+            trades = chain.from_iterable(h for h in histories if h)
+            epochs[filled] = np.fromiter(map(itemgetter(0), trades), np.int64, counts.sum())
+            e_max = np.where(filled, epochs, np.iinfo(np.int64).min).max(axis=1)
+            e_min = np.where(filled, epochs, np.iinfo(np.int64).max).min(axis=1)
+
+            with np.errstate(all='ignore'):
+                hours = np.where(e_max > e_min, (e_max - e_min) / 3600, 1 / 3600)
+                tmp['frequency'] = np.where(counts > 0, counts / hours, np.nan)
+
+            if any(b is not None and len(b) > 0 for b in books):
+                tmp.update(self._indexes_books(books, depth))
+
+            with np.errstate(all='ignore'):
+                passed = (tmp['frequency'] > 60) & (tmp['buy_pressure'] > 5) & (tmp['spread'] < 1)
+                wild = tmp['frequency'] * tmp['buy_pressure'] / tmp['spread']
+
+            # math.log() instead of numpy.log(), since the latter may differ in the last bit.
+            tmp['score'] = np.array([(w / abs(w)) * abs(math.log(abs(w))) if p and w != 0 else 0.
+                                     for w, p in zip(wild.tolist(), passed.tolist())])
+            return tmp
+
+        except:
+            self.log(traceback.format_exc())
+
     def smooth(self, wild, sigmoid=False):
         """
         https://en.wikipedia.org/wiki/Natural_logarithm
@@ -94,24 +172,118 @@ class Toolkit(object):
         except:
             self.log(traceback.format_exc())
 
-    def log(self, message, caller=None, lines_before=1):
+    def _indexes(self, histories, books, depth):
+        """
+        Plain Python fallback for 'indexes()'.
+        """
+
+        keys = ['frequency', 'l_ask', 'h_bid', 'l_ask_weight', 'h_bid_weight', 'buy_pressure', 'spread', 'score']
+        tmp = {k: [] for k in keys}
+
+        for history, book in zip(histories, books):
+            row = dict.fromkeys(keys, float('nan'))
+            row['score'] = 0.
+
+            if history is not None and len(history) > 0:
+                epochs = set(list(zip(*history))[0])
+                hours = [(max(epochs) - min(epochs)) / 3600, 1 / 3600][len(epochs) == 1]
+                row['frequency'] = len(history) / hours
+
+                ticker = self.ticker(book, depth) if book is not None and len(book) > 0 else None
+                if ticker is not None:
+                    l_ask, h_bid, (l_ask_weight, h_bid_weight, buy_pressure) = ticker
+                    row.update({'l_ask': l_ask, 'h_bid': h_bid, 'l_ask_weight': l_ask_weight,
+                                'h_bid_weight': h_bid_weight, 'buy_pressure': buy_pressure,
+                                'spread': 100 * (l_ask / h_bid - 1)})
+
+                    if row['frequency'] > 60 and buy_pressure > 5 and row['spread'] < 1:
+                        row['score'] = self.smooth(row['frequency'] * buy_pressure / row['spread'])
+
+            for k in keys:
+                tmp[k].append(row[k])
+        return tmp
+
+    def _indexes_books(self, books, depth):
+        """
+        The ticker part of 'indexes()': books are stacked into (padded) arrays, one row per symbol.
+        """
+
+        np, n = numpy, len(books)
+        books = [b if b is None or isinstance(b, OrderBook) else OrderBook(b) for b in books]
+        sides = [b.arrays() if b is not None else (None,) * 4 for b in books]
+        n_asks = max(1, max(len(s[0]) for s in sides if s[0] is not None))
+        n_bids = max(1, max(len(s[2]) for s in sides if s[2] is not None))
+
+        a_prices, a_amounts = np.full((n, n_asks), np.inf), np.zeros((n, n_asks))
+        b_prices, b_amounts = np.full((n, n_bids), -np.inf), np.zeros((n, n_bids))
+        for i, (ap, aa, bp, ba) in enumerate(sides):
+            if ap is not None:
+                a_prices[i, :len(ap)] = np.frombuffer(ap)
+                a_amounts[i, :len(aa)] = np.frombuffer(aa)
+                b_prices[i, :len(bp)] = np.frombuffer(bp)
+                b_amounts[i, :len(ba)] = np.frombuffer(ba)
+
+        with np.errstate(all='ignore'):
+            l_ask = a_prices[:, 0]
+            h_bid = np.where(b_prices < l_ask[:, None], b_prices, -np.inf).max(axis=1)
+            valid = np.isfinite(l_ask) & np.isfinite(h_bid)
+            h_ask, l_bid = (1 + depth / 100) * l_ask, (1 - depth / 100) * h_bid
+
+            in_asks = (a_prices >= l_bid[:, None]) & (a_prices <= h_ask[:, None])
+            in_bids = (b_prices >= l_bid[:, None]) & (b_prices <= h_ask[:, None])
+            ask_notionals = np.where(in_asks, a_prices * a_amounts, 0.)
+            bid_notionals = np.where(in_bids, b_prices * b_amounts, 0.)
+
+            # cumulative sums add one element after another (in ascending prices), just like 'sum()' does.
+            ask_total = np.cumsum(ask_notionals, axis=1)[:, -1]
+            bid_total = np.cumsum(bid_notionals, axis=1)[:, -1]
+
+            last_bid = n_bids - 1 - np.argmax(in_bids[:, ::-1], axis=1)
+            rows = np.arange(n)
+            l_ask_weight = np.trunc(a_prices[:, 0] * a_amounts[:, 0] / self.Quota)
+            h_bid_weight = np.trunc(b_prices[rows, last_bid] * b_amounts[rows, last_bid] / self.Quota)
+
+            return {
+                'l_ask': np.where(valid, l_ask, np.nan),
+                'h_bid': np.where(valid, h_bid, np.nan),
+                'l_ask_weight': np.where(valid, l_ask_weight, np.nan),
+                'h_bid_weight': np.where(valid, h_bid_weight, np.nan),
+                'buy_pressure': np.where(valid, 100 * (bid_total / ask_total - 1), np.nan),
+                'spread': np.where(valid, 100 * (l_ask / h_bid - 1), np.nan),
+            }
+
+    def log(self, message, caller=None, lines_before=1, args=()):
         """
         Better starve to death before use this:
 
         https://docs.python.org/release/3.4.3/library/logging.html
+
+        If 'args' are given, 'message' is a format string for them (formatted only when written, so better
+        pass big payloads this way). With the 'async' logging at '/bin/conf.ini', 'Journal' writes it all.
         """
 
+        try:
+            if caller is not None:
+                operation = caller.Brand.upper()
+                component = self._components.get(type(caller))
+                if component is None:
+                    component = self._components[type(caller)] = type(caller).__name__.upper()
+            else:
+                operation, component = 'Kebnekaise', 'TOOLKIT'
+
+            if self.Journal is not None:
+                return self.Journal.put(operation, component, message, lines_before, args)
+        except:
+            operation, component = 'Kebnekaise', 'TOOLKIT'
+
         now_str = time.strftime('%Y.%m.%d.%Z.%H.%M.%S', time.gmtime())
         now_str = now_str.replace('GMT', 'UTC')
         today = now_str[:10].replace('.', '_')
         logfile = self.Path + '/logs/' + today + '.'
 
         try:
-            if caller is not None:
-                operation = caller.Brand.upper()
-                component = dict(inspect.getmembers(caller))['__class__'].__name__.upper()
-            else:
-                operation, component = 'Kebnekaise', 'TOOLKIT'
+            if len(args) > 0:
+                message = message.format(*args)
 
             tmp = ''.join('{0} |{1}| \n'.format(
                 now_str, component) for _ in range(lines_before))
@@ -122,9 +294,38 @@ class Toolkit(object):
             with open(self.check(logfile + 'err'), 'a') as fp:
                 fp.writelines([traceback.format_exc() + '\n'])
 
+    def flush(self):
+        """
+        Makes sure every log message (and metric) is written: call it before the process ends.
+        """
+
+        try:
+            if self.Metrics.Interval > 0:
+                self.Metrics.export()
+            if self.Journal is not None:
+                self.Journal.close()
+        except:
+            pass
+
     def wait(self, minutes=1.):
         """
-        A more sophisticated alternative to 'time.sleep()', puts random sized delays.
+        A more sophisticated alternative to 'time.sleep()', puts random sized delays
+        (and returns as soon as the system is halted).
+        """
+
+        try:
+            delay = int(60 * minutes)
+            delay = [delay, 30][delay < 30]
+            r = random.randrange(delay - 5, delay + 5)
+
+            self.sleep(r)
+            return r
+        except:
+            self.log(traceback.format_exc())
+
+    async def snooze(self, minutes=1.):
+        """
+        Same as 'wait()', but for coroutines (it doesn't block the event loop).
         """
 
         try:
@@ -132,10 +333,55 @@ class Toolkit(object):
             delay = [delay, 30][delay < 30]
             c, r = 0, random.randrange(delay - 5, delay + 5)
 
-            while not (self.halt() or c == r):
-                time.sleep(1)
+            while not (self.halt() or c >= 10 * r):
+                await asyncio.sleep(.1)
                 c += 1
             return r
+        except asyncio.CancelledError:
+            raise
+        except:
+            self.log(traceback.format_exc())
+
+    def clock(self):
+        """
+        Just like 'time.time()', unless a simulated 'Clock' is in use.
+        """
+
+        if self.Clock is None:
+            return time.time()
+        return self.Clock.now()
+
+    def sleep(self, seconds):
+        """
+        Just like 'time.sleep()', but wakes up as soon as the system is halted (returning True, if so).
+        A simulated 'Clock' just moves forward, instead.
+        """
+
+        if self.Clock is not None:
+            self.Clock.advance(seconds)
+            return self.halt()
+        if self._halted:
+            return True
+        self._halted = self.Stop.wait(seconds)
+        return self._halted
+
+    def track(self, wrapper, order_id, pending=('open', 'partial'), timeout=10., delay=.1, cap=2.):
+        """
+        Polls the status of an order (see 'status()' at every plugin), with exponentially growing delays
+        (from 'delay' up to 'cap' seconds), until it leaves the 'pending' states or 'timeout' seconds go by.
+        Returns its last (state, executed amount), or None if it's unknown.
+        """
+
+        try:
+            deadline = self.clock() + timeout
+            while True:
+                status = wrapper.status(order_id)
+                state, remaining = None if status is None else status[0], deadline - self.clock()
+                if state not in pending or remaining <= 0 or self.halt():
+                    return status
+
+                self.sleep(min(delay, remaining))
+                delay = min(cap, 2 * delay)
         except:
             self.log(traceback.format_exc())
 
@@ -143,6 +389,9 @@ class Toolkit(object):
         """
         READ for the HALT command, SEND it, or CLEAN the HALT file.
 
+        Reading is just an in-memory test: the HALT file (see 'bin/stop.sh') and the SIGTERM / SIGINT signals
+        are turned into the shared 'Stop' event by 'watch()', which must be called before forking.
+
         IMPORTANT:
             In order to prevents the system from ignoring your halt commands, please
             don't forget to include this test in your (heavy) loops!
@@ -165,14 +414,88 @@ class Toolkit(object):
                 self.check(halt_file, True)
             elif send:
                 self.check(halt_file)
+                self.Stop.set()
             elif self._halted:
                 return self._halted
             else:
-                self._halted = exists(halt_file)
+                self._halted = self.Stop.is_set()
                 return self._halted
         except:
             self.log(traceback.format_exc())
 
+    def watch(self, interval=1.):
+        """
+        Sets the 'Stop' event as soon as the HALT file appears (by using inotify, or checking it
+        every 'interval' seconds if that's not available) or a SIGTERM / SIGINT signal is received.
+        """
+
+        try:
+            if self._watching is not None and self._watching.is_alive():
+                return
+
+            def stop(signum, frame):
+                # Never set it right here: the interrupted code may be holding the event's lock.
+                threading.Thread(target=self.Stop.set, daemon=True).start()
+
+            for signum in [signal.SIGTERM, signal.SIGINT]:
+                signal.signal(signum, stop)
+
+            folder = self.Path + '/logs/'
+            os.makedirs(folder, exist_ok=True)
+            fd = self._inotify(folder)
+            target = self._polling if fd is None else self._reading
+            self._watching = threading.Thread(target=target, args=(folder, [fd, interval][fd is None]), daemon=True)
+            self._watching.start()
+        except:
+            self.log(traceback.format_exc())
+
+    def _inotify(self, folder, mask=0x00000100 | 0x00000080):
+        """
+        http://man7.org/linux/man-pages/man7/inotify.7.html
+
+        Returns a file descriptor to read the IN_CREATE / IN_MOVED_TO events of 'folder' from (or None).
+        """
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+            assert fd >= 0
+            if libc.inotify_add_watch(fd, folder.encode(), mask) < 0:
+                os.close(fd)
+                return
+            return fd
+        except (AssertionError, AttributeError, OSError, TypeError):
+            return
+
+    def _reading(self, folder, fd, header=struct.Struct('iIII')):
+        """
+        """
+
+        try:
+            while not exists(folder + '.halt'):
+                data = os.read(fd, 4096)
+                names = []
+                while len(data) >= header.size:
+                    _, _, _, length = header.unpack_from(data)
+                    names.append(data[header.size:header.size + length].rstrip(b'\0'))
+                    data = data[header.size + length:]
+                if b'.halt' in names:
+                    break
+            self.Stop.set()
+        except:
+            self.log(traceback.format_exc())
+            self._polling(folder)
+        finally:
+            os.close(fd)
+
+    def _polling(self, folder, interval=1.):
+        """
+        """
+
+        while not (exists(folder + '.halt') or self.Stop.wait(interval)):
+            pass
+        self.Stop.set()
+
     def check(self, fqfn, remove=False):
         """
         Ensures the existence or removal of the file whose path is given.
@@ -212,6 +535,163 @@ class Toolkit(object):
             self.log(traceback.format_exc())
 
 
+class OrderBook(MutableMapping):
+    """
+    https://en.wikipedia.org/wiki/Order_book_(trading)
+
+    Still the good old {price: amount} dictionary (asks with positive amounts, bids with negative ones),
+    but backed by two sorted arrays, so the best prices and price ranges are just binary searches.
+    """
+
+    def __init__(self, levels=None):
+        """
+        Constructor method.
+        """
+
+        self._asks, self._ask_amounts = array('d'), array('d')
+        self._bids, self._bid_amounts = array('d'), array('d')  # ascending prices, positive amounts.
+
+        if levels is not None:
+            levels = levels.items() if isinstance(levels, Mapping) else levels
+            asks, bids = [], []
+            for price, amount in levels:
+                if amount > 0:
+                    asks.append((price, amount))
+                elif amount < 0:
+                    bids.append((price, -amount))
+            self._fill(asks, bids)
+
+    @classmethod
+    def from_sides(cls, asks, bids):
+        """
+        Builds the book from two iterables of (price, amount) pairs, both with positive amounts.
+        """
+
+        tmp = cls()
+        tmp._fill(asks, bids)
+        return tmp
+
+    def best(self):
+        """
+        Lowest Ask and Highest Bid (under that ask), or None if any side is empty.
+        """
+
+        if len(self._asks) > 0:
+            l_ask = self._asks[0]
+            i = bisect_left(self._bids, l_ask)
+            if i > 0:
+                return l_ask, self._bids[i - 1]
+
+    def asks(self, low, high):
+        """
+        The (price, amount) pairs of asks with low <= price <= high, ascending.
+        """
+
+        i, j = bisect_left(self._asks, low), bisect_right(self._asks, high)
+        return list(zip(self._asks[i:j], self._ask_amounts[i:j]))
+
+    def bids(self, low, high):
+        """
+        The (price, amount) pairs of bids with low <= price <= high, ascending (and positive amounts).
+        """
+
+        i, j = bisect_left(self._bids, low), bisect_right(self._bids, high)
+        return list(zip(self._bids[i:j], self._bid_amounts[i:j]))
+
+    def window(self, margin=1):
+        """
+        A new book with only the asks (bids) up to 'margin' % above (below) the best ones,
+        or None if any side is empty.
+        """
+
+        if len(self._asks) * len(self._bids) > 0:
+            h_ask = (1 + margin / 100) * self._asks[0]
+            l_bid = (1 - margin / 100) * self._bids[-1]
+            i, j = bisect_right(self._asks, h_ask), bisect_left(self._bids, l_bid)
+
+            tmp = OrderBook()
+            tmp._asks, tmp._ask_amounts = self._asks[:i], self._ask_amounts[:i]
+            tmp._bids, tmp._bid_amounts = self._bids[j:], self._bid_amounts[j:]
+            return tmp
+
+    def arrays(self):
+        """
+        The inner arrays (ask prices, ask amounts, bid prices, bid amounts), all of them in ascending prices.
+        Don't change them: that's for reading (e.g. by 'numpy.frombuffer()') without copying anything.
+        """
+
+        return self._asks, self._ask_amounts, self._bids, self._bid_amounts
+
+    def copy(self):
+        """
+        """
+
+        tmp = OrderBook()
+        tmp._asks, tmp._ask_amounts = self._asks[:], self._ask_amounts[:]
+        tmp._bids, tmp._bid_amounts = self._bids[:], self._bid_amounts[:]
+        return tmp
+
+    def __getitem__(self, price):
+        for prices, amounts, sign in self._sides():
+            i = bisect_left(prices, price)
+            if i < len(prices) and prices[i] == price:
+                return sign * amounts[i]
+        raise KeyError(price)
+
+    def __setitem__(self, price, amount):
+        """
+        In place update of a single level (a zero amount removes it).
+        """
+
+        self._discard(price)
+        if amount != 0:
+            prices, amounts = [(self._bids, self._bid_amounts), (self._asks, self._ask_amounts)][amount > 0]
+            i = bisect_left(prices, price)
+            prices.insert(i, price)
+            amounts.insert(i, abs(amount))
+
+    def __delitem__(self, price):
+        if not self._discard(price):
+            raise KeyError(price)
+
+    def __iter__(self):
+        return merge(self._bids, self._asks)
+
+    def __len__(self):
+        return len(self._asks) + len(self._bids)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def _sides(self):
+        """
+        """
+
+        return (self._asks, self._ask_amounts, 1), (self._bids, self._bid_amounts, -1)
+
+    def _discard(self, price):
+        """
+        """
+
+        for prices, amounts, _ in self._sides():
+            i = bisect_left(prices, price)
+            if i < len(prices) and prices[i] == price:
+                del prices[i]
+                del amounts[i]
+                return True
+        return False
+
+    def _fill(self, asks, bids):
+        """
+        """
+
+        for (prices, amounts), levels in [((self._asks, self._ask_amounts), asks),
+                                          ((self._bids, self._bid_amounts), bids)]:
+            levels = sorted(levels)
+            prices.extend(p for p, _ in levels)
+            amounts.extend(a for _, a in levels)
+
+
 class Auditor(object):
     """
     Health test for enabled plugins.
@@ -276,7 +756,7 @@ class Auditor(object):
                 random.shuffle(self._cache['symbols'])
             else:
                 self._cache['errors'] += 1
-            self.log('The response was: ' + str(S), self)
+            self.log('The response was: {}', self, args=(S,))
 
             self.log('(Were found {0} symbols total)'.format(ls), self)
         except:
@@ -295,7 +775,7 @@ class Auditor(object):
             self.log('Using the following parameters: ' + str(params), self)
 
             ohlcv = self.Wrapper.ohlcv(**params)
-            self.log('The response was: ' + str(ohlcv), self)
+            self.log('The response was: {}', self, args=(ohlcv,))
         except:
             self.log(traceback.format_exc(), self)
             self._cache['errors'] += 1
@@ -312,7 +792,7 @@ class Auditor(object):
             self.log('Using the following parameters: ' + str(params), self)
 
             history = self.Wrapper.history(**params)
-            self.log('The response was: ' + str(history), self)
+            self.log('The response was: {}', self, args=(history,))
         except:
             self.log(traceback.format_exc(), self)
             self._cache['errors'] += 1
@@ -329,7 +809,7 @@ class Auditor(object):
             self.log('Using the following parameters: ' + str(params), self)
 
             book = self.Wrapper.book(**params)
-            self.log('The response was: ' + str(book), self)
+            self.log('The response was: {}', self, args=(book,))
         except:
             self.log(traceback.format_exc(), self)
             self._cache['errors'] += 1
@@ -343,7 +823,7 @@ class Auditor(object):
             self.log('Testing [BALANCE] functionality...', self)
 
             self._cache['balance'] = self.Wrapper.balance()
-            self.log('The response was: ' + str(self._cache['balance']), self)
+            self.log('The response was: {}', self, args=(self._cache['balance'],))
 
             if self._cache['balance']['btc'][0] < self.Toolkit.Quota:
                 self.log('BALANCE ERROR: please make sure you have at least BTC ' + str(self.Toolkit.Quota) +
@@ -373,10 +853,10 @@ class Auditor(object):
 
             buying = self.Wrapper.fire(**params)
             assert buying is not None
-            oid, _ = buying
+            oid = buying[0]
 
             self._cache['orders'].append(oid)
-            self.log('The response was: ' + str(buying), self)
+            self.log('The response was: {}', self, args=(buying,))
 
         except AssertionError:
             self.log('Internal error or insufficient funds to make BUY tests...', self)
@@ -394,7 +874,7 @@ class Auditor(object):
             self.log('Testing [ORDERS] functionality...', self)
 
             O = self.Wrapper.orders()
-            self.log('The response was: ' + str(O), self)
+            self.log('The response was: {}', self, args=(O,))
         except:
             self.log(traceback.format_exc(), self)
             self._cache['errors'] += 1
@@ -412,7 +892,7 @@ class Auditor(object):
                 self.log('Using the following parameters: ' + str(params), self)
 
                 C = self.Wrapper.cancel(**params)
-                self.log('The response was: ' + str(C), self)
+                self.log('The response was: {}', self, args=(C,))
 
             orders = list(self.Wrapper.orders().items())
             self.log('(Current open orders are: {0})'.format(orders), self)
@@ -440,10 +920,10 @@ class Auditor(object):
 
             selling = self.Wrapper.fire(**params)
             assert selling is not None
-            oid, _ = selling
+            oid = selling[0]
 
             self._cache['orders'].append(oid)
-            self.log('The response was: ' + str(selling), self)
+            self.log('The response was: {}', self, args=(selling,))
 
             orders = list(self.Wrapper.orders().items())
             self.log('(Current open orders are: {})'.format(orders), self)
@@ -1,12 +1,20 @@
+import ast
 import inspect
 import os
 import pickle
+import sqlite3
+import threading
 import traceback
 
 
 class Database(object):
     """
     Another simplified solution for persistence.
+
+    https://www.sqlite.org/wal.html
+    One SQLite file per brand, in WAL mode: readers (even in other processes) always see a
+    consistent snapshot, and writes only touch the keys which have actually changed.
+    Reads are cached in memory for as long as the files remain untouched (same mtime and size).
     """
 
     def __init__(self, wrapper):
@@ -18,8 +26,11 @@ class Database(object):
         self.Brand = self.Wrapper.Brand
 
         self.Toolkit = self.Wrapper.Toolkit
-        self.Path = self.Toolkit.Path
+        self.Path = self.Toolkit.Data
         self.log = self.Toolkit.log
+
+        self._lock = threading.Lock()
+        self._connections, self._written, self._cache = {}, {}, {}
         self.log(self.Toolkit.Greeting, self)
 
     def query(self, account, data=None):
@@ -28,11 +39,11 @@ class Database(object):
 
         try:
             account = dict(inspect.getmembers(account))['__class__'].__name__.upper()
-            path = self.Path + '/data/'
-            fqfn = path + self.Brand + '.db'
+            path = self.Path
+            fqfn = path + self.Brand + '.sqlite'
 
             if data is None:  # reads only you
-                tmp = self._load(fqfn)
+                tmp = self._load(fqfn, account)
                 if account in tmp:
                     return tmp[account]
                 return {}
@@ -40,12 +51,13 @@ class Database(object):
             elif type(data) in [int, float]:  # reads everyone
                 tmp = {}
                 for dbfile in os.listdir(path):
-                    brand = dbfile.split('.')[0].upper()
-                    data = self._load(path + dbfile)
-                    if account in data:
-                        tmp[brand] = data[account]
-                    else:
-                        tmp[brand] = {}
+                    if dbfile.endswith('.sqlite'):
+                        brand = dbfile.split('.')[0].upper()
+                        data = self._load(path + dbfile, account)
+                        if account in data:
+                            tmp[brand] = data[account]
+                        else:
+                            tmp[brand] = {}
                 return tmp
 
             else:  # write (only you)
@@ -57,35 +69,139 @@ class Database(object):
         except:
             self.log(traceback.format_exc(), self)
 
-    def _load(self, archive, data=None):
+    def _load(self, archive, account):
         """
         """
 
         try:
-            self.Toolkit.check(archive)
-            if os.stat(archive).st_size == 0:
-                with open(archive, 'wb') as fp:
-                    pickle.dump({}, fp, pickle.HIGHEST_PROTOCOL)
+            with self._lock:
+                conn = self._connect(archive)
+                signature = self._signature(archive)
+                cached = self._cache.get((archive, account))
 
-            with open(archive, 'rb') as fp:
-                tmp = pickle.load(fp)
+                if cached is None or cached[0] != signature:
+                    rows = conn.execute('SELECT key, field, value FROM store WHERE account = ?', (account,))
+                    cached = signature, self._unflatten(rows.fetchall())
+                    self._cache[(archive, account)] = cached
 
-            if data is not None:
-                tmp.update(data)
-            return tmp
+            if len(cached[1]) == 0:
+                return {}
+            return {account: self._copy(cached[1])}
         except:
             self.log(traceback.format_exc(), self)
 
     def _dump(self, archive, data=None):
         """
+        Writes (and deletes) only the rows which are different from what is stored already.
         """
 
         try:
             if data is None:
                 data = {}
 
-            data = self._load(archive, data)
-            with open(archive, 'wb') as fp:
-                pickle.dump(data, fp, pickle.HIGHEST_PROTOCOL)
+            with self._lock:
+                conn = self._connect(archive)
+                with conn:
+                    conn.execute('BEGIN IMMEDIATE')
+                    for account, values in data.items():
+                        rows = self._flatten(values)
+                        written = self._written.get((archive, account))
+                        if written is None:
+                            written = {(k, f): v for k, f, v in conn.execute(
+                                'SELECT key, field, value FROM store WHERE account = ?', (account,))}
+
+                        conn.executemany('DELETE FROM store WHERE account = ? AND key = ? AND field = ?',
+                                         [(account, k, f) for k, f in set(written) - set(rows)])
+                        conn.executemany('INSERT OR REPLACE INTO store VALUES (?, ?, ?, ?)',
+                                         [(account, k, f, v) for (k, f), v in rows.items()
+                                          if (k, f) not in written or written[(k, f)] != v])
+                        self._written[(archive, account)] = rows
+                for account, values in data.items():  # write-through
+                    self._cache[(archive, account)] = self._signature(archive), self._copy(values)
         except:
-            self.log(traceback.format_exc(), self)
\ No newline at end of file
+            self._written, self._cache = {}, {}  # nothing known for sure, after a failure.
+            self.log(traceback.format_exc(), self)
+
+    def _connect(self, archive):
+        """
+        One connection for each file (already locked), created (and migrated from the old
+        pickle files, if there's one) the first time it's needed.
+        """
+
+        if archive not in self._connections:
+            self.Toolkit.check(archive)
+            conn = sqlite3.connect(archive, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS store (account TEXT, key TEXT, field TEXT, value BLOB, '
+                         'PRIMARY KEY (account, key, field))')
+            self._connections[archive] = conn
+
+            legacy = archive[:-len('.sqlite')] + '.db'
+            if os.path.exists(legacy) and conn.execute('SELECT COUNT(*) FROM store').fetchone()[0] == 0:
+                with open(legacy, 'rb') as fp:
+                    tmp = pickle.load(fp)
+                with conn:
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.executemany('INSERT OR REPLACE INTO store VALUES (?, ?, ?, ?)',
+                                     [(a, k, f, v) for a, values in tmp.items()
+                                      for (k, f), v in self._flatten(values).items()])
+                os.rename(legacy, legacy + '.bak')
+
+        return self._connections[archive]
+
+    def _signature(self, archive):
+        """
+        (mtime, size) of the file and its write-ahead log: any change there may mean new data.
+        """
+
+        tmp = []
+        for fqfn in [archive, archive + '-wal']:
+            try:
+                st = os.stat(fqfn)
+                tmp.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                tmp.append(None)
+        return tuple(tmp)
+
+    def _copy(self, values):
+        """
+        Callers are free to change what they get, without touching the cache (stored data is at most
+        two levels deep, and the values themselves are immutable most of the time).
+        """
+
+        return {k: dict(v) if type(v) == dict else v for k, v in values.items()}
+
+    def _flatten(self, values):
+        """
+        {key: value} becomes {(key, ''): value} rows, but {key: {field: value}} becomes {(key, field): value}
+        (plus a {(key, ''): None} row, meaning "a dictionary"): so a single field can be written alone.
+        Keys and fields are stored by their 'repr()', values are pickled.
+        """
+
+        tmp = {}
+        for key, value in values.items():
+            key = repr(key)
+            if type(value) == dict:
+                tmp[(key, '')] = None
+                for field, v in value.items():
+                    tmp[(key, repr(field))] = pickle.dumps(v, pickle.HIGHEST_PROTOCOL)
+            else:
+                tmp[(key, '')] = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return tmp
+
+    def _unflatten(self, rows):
+        """
+        """
+
+        tmp = {}
+        for key, field, value in rows:
+            key = ast.literal_eval(key)
+            if field == '':
+                if value is None:
+                    tmp.setdefault(key, {})
+                else:
+                    tmp[key] = pickle.loads(value)
+            else:
+                tmp.setdefault(key, {})[ast.literal_eval(field)] = pickle.loads(value)
+        return tmp
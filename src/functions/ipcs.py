@@ -0,0 +1,119 @@
+import struct
+import time
+import traceback
+
+from multiprocessing import shared_memory
+
+
+class Bus(object):
+    """
+    https://en.wikipedia.org/wiki/Seqlock
+
+    A shared memory segment, created by the control process, where each exchange publishes its
+    latest best prices and scores (one fixed-size slot per exchange), so everyone else can read them
+    without any file I/O. Each slot has a sequence number (odd while being written) to make sure
+    readers never see it half updated.
+    """
+
+    Header = struct.Struct('<4sII')  # magic, number of slots, records per slot
+    Slot = struct.Struct('<16sQdI4x')  # brand, sequence, timestamp, records in use
+    Record = struct.Struct('<12s12sdddd')  # base, quote, lowest ask, highest bid, score, timestamp
+    Magic = b'KBNK'
+
+    def __init__(self, toolkit, brands=None, records=16, name=None):
+        """
+        Constructor method: creates a new segment for 'brands' or, if just a 'name' is given, attaches to it.
+        """
+
+        self.Toolkit = toolkit
+        self.log = self.Toolkit.log
+
+        if name is None:
+            brands = sorted(brands)
+            size = self.Header.size + len(brands) * (self.Slot.size + records * self.Record.size)
+            self.Memory = shared_memory.SharedMemory(create=True, size=size)
+            self.Header.pack_into(self.Memory.buf, 0, self.Magic, len(brands), records)
+            for i, brand in enumerate(brands):
+                self.Slot.pack_into(self.Memory.buf, self._offset(i, records), brand.encode(), 0, 0., 0)
+        else:
+            self.Memory = shared_memory.SharedMemory(name=name)
+
+        magic, slots, self.Records = self.Header.unpack_from(self.Memory.buf, 0)
+        assert magic == self.Magic
+
+        self.Name = self.Memory.name
+        self.Brands = {self.Slot.unpack_from(self.Memory.buf, self._offset(i))[0].rstrip(b'\0').decode(): i
+                       for i in range(slots)}
+
+    def publish(self, brand, entries):
+        """
+        Replaces the slot of 'brand' with 'entries', a {symbol: (l_ask, h_bid, score)} dictionary
+        (only the best 'Records' scores fit there).
+        """
+
+        try:
+            buf, now = self.Memory.buf, time.time()
+            offset = self._offset(self.Brands[brand])
+            _, sequence, _, _ = self.Slot.unpack_from(buf, offset)
+            best = sorted(entries.items(), key=lambda k: k[1][2], reverse=True)[:self.Records]
+
+            self.Slot.pack_into(buf, offset, brand.encode(), sequence + 1, now, 0)  # odd: writing...
+            for i, ((base, quote), (l_ask, h_bid, score)) in enumerate(best):
+                self.Record.pack_into(buf, offset + self.Slot.size + i * self.Record.size,
+                                      base.encode(), quote.encode(), l_ask, h_bid, score, now)
+            self.Slot.pack_into(buf, offset, brand.encode(), sequence + 2, now, len(best))  # even: done.
+
+        except:
+            self.log(traceback.format_exc())
+
+    def snapshot(self, brands=None, retry=100):
+        """
+        A consistent {brand: (timestamp, {symbol: (l_ask, h_bid, score, timestamp)})} view of every slot
+        (or just the ones in 'brands'), unpacked straight from the shared memory.
+        """
+
+        try:
+            buf, tmp = self.Memory.buf, {}
+            for brand, i in self.Brands.items():
+                if brands is not None and brand not in brands:
+                    continue
+
+                offset = self._offset(i)
+                for _ in range(retry):
+                    _, before, stamp, count = self.Slot.unpack_from(buf, offset)
+                    if before % 2 == 1:
+                        time.sleep(0)
+                        continue
+
+                    data = {}
+                    for j in range(count):
+                        base, quote, l_ask, h_bid, score, ts = self.Record.unpack_from(
+                            buf, offset + self.Slot.size + j * self.Record.size)
+                        data[(base.rstrip(b'\0').decode(), quote.rstrip(b'\0').decode())] = l_ask, h_bid, score, ts
+
+                    if self.Slot.unpack_from(buf, offset)[1] == before:
+                        tmp[brand] = stamp, data
+                        break
+            return tmp
+
+        except:
+            self.log(traceback.format_exc())
+
+    def close(self, unlink=False):
+        """
+        Every process should close it when done; the one which created it should unlink it as well.
+        """
+
+        try:
+            self.Memory.close()
+            if unlink:
+                self.Memory.unlink()
+        except:
+            self.log(traceback.format_exc())
+
+    def _offset(self, slot, records=None):
+        """
+        """
+
+        records = self.Records if records is None else records
+        return self.Header.size + slot * (self.Slot.size + records * self.Record.size)
@@ -0,0 +1,227 @@
+import fcntl
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+import traceback
+
+
+class Journal(object):
+    """
+    https://en.wikipedia.org/wiki/Producer%E2%80%93consumer_problem
+
+    Log lines are just queued by whoever logs them: a background thread formats them, writes them
+    in batches to files kept open and, once a day is over, compresses that day's files.
+
+    Many processes may append to the same file (e.g. '<day>.Kebnekaise.log'): each one keeps a shared lock
+    on the files it has open, so only the last one done with a file gets it exclusively (and compresses it).
+    """
+
+    def __init__(self, path, size=10000, truncate=4096, batch=1000):
+        """
+        Constructor method.
+        """
+
+        self.Path = path
+        self.Size, self.Truncate, self.Batch = size, truncate, batch
+        self.Dropped = 0
+
+        self._lock = threading.Lock()
+        self._pid, self._queue, self._thread = None, None, None
+        self._files, self._today = {}, None
+        self._stamp = (None, '')
+
+    def put(self, operation, component, message, lines_before=1, args=()):
+        """
+        Never blocks: if the queue is full (the disk can't keep up), the message is just dropped and counted.
+        """
+
+        self._start()
+        try:
+            self._queue.put_nowait((time.time(), operation, component, message, lines_before, args))
+        except queue.Full:
+            self.Dropped += 1
+
+    def flush(self, timeout=5.):
+        """
+        Waits (up to 'timeout' seconds) until everything queued so far is written.
+        """
+
+        if self._pid == os.getpid() and self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            return done.wait(timeout)
+
+    def close(self, timeout=5.):
+        """
+        Writes everything still queued and stops the writer (a new one starts if something is logged again).
+        """
+
+        if self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _start(self):
+        """
+        One writer per process: the parent's thread (and queue) are useless after a fork.
+        """
+
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid, self._queue, self._files = os.getpid(), queue.Queue(self.Size), {}
+                self._thread = threading.Thread(target=self._run, name='journal', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """
+        """
+
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.Batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines, events, stop = {}, [], False
+            for item in batch:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    events.append(item)
+                else:
+                    day, text = self._format(*item)
+                    lines.setdefault((day, item[1]), []).append(text)
+
+            try:
+                for (day, operation), texts in lines.items():
+                    self._file(day, operation).writelines(texts)
+                for fp in self._files.values():
+                    fp.flush()
+                if self.Dropped > 0:
+                    self._error('({} log messages dropped, the queue was full.)\n'.format(self.Dropped))
+                    self.Dropped = 0
+            except:
+                self._error(traceback.format_exc() + '\n')
+
+            for e in events:
+                e.set()
+            if stop:
+                self._rotate(self._today is not None and self._today < time.strftime('%Y_%m_%d', time.gmtime()))
+                return
+
+    def _format(self, stamp, operation, component, message, lines_before, args):
+        """
+        Returns the day (as in the file name) and the formatted lines, truncated if they're too long.
+        """
+
+        second = int(stamp)
+        if second != self._stamp[0]:
+            now_str = time.strftime('%Y.%m.%d.%Z.%H.%M.%S', time.gmtime(second)).replace('GMT', 'UTC')
+            self._stamp = second, now_str
+        now_str = self._stamp[1]
+
+        try:
+            message = str(message).format(*args) if len(args) > 0 else str(message)
+        except:
+            message = '{0} {1}'.format(message, args)
+        if 0 < self.Truncate < len(message):
+            message = message[:self.Truncate] + ' [...] ({} more characters)'.format(len(message) - self.Truncate)
+
+        tmp = ''.join('{0} |{1}| \n'.format(now_str, component) for _ in range(lines_before))
+        return now_str[:10].replace('.', '_'), tmp + '{0} |{1}| {2}\n'.format(now_str, component, message)
+
+    def _file(self, day, operation):
+        """
+        """
+
+        if self._today is not None and day < self._today:
+            day = self._today  # queued just before midnight: yesterday's file may be compressed already.
+        elif day != self._today:
+            self._rotate(self._today is not None)
+            self._today = day
+
+        if (day, operation) not in self._files:
+            os.makedirs(self.Path, exist_ok=True)
+            self._files[(day, operation)] = self._open(self.Path + day + '.' + operation + '.log')
+        return self._files[(day, operation)]
+
+    def _rotate(self, compress=True):
+        """
+        Closes every file (releasing their locks) and then tries to compress them.
+        """
+
+        closed = [fp.name for fp in self._files.values()]
+        for fp in self._files.values():
+            fp.close()
+        self._files = {}
+
+        if compress:
+            for fqfn in closed:
+                self._compress(fqfn)
+
+    def _open(self, fqfn):
+        """
+        Under a shared lock: if the file was compressed (and removed) while waiting for it, a new one is created.
+        """
+
+        while True:
+            fp = open(fqfn, 'a')
+            fcntl.flock(fp, fcntl.LOCK_SH)
+            if self._linked(fp):
+                return fp
+            fp.close()
+
+    def _compress(self, fqfn):
+        """
+        Only if no other process is still appending to it: the last one to close it does it, then.
+        The archive is appended to (gzip allows many members in a file), never replaced.
+        """
+
+        try:
+            with open(fqfn, 'rb') as src:
+                try:
+                    fcntl.flock(src, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return
+                if not self._linked(src):
+                    return  # compressed by another process already.
+
+                with open(fqfn + '.gz', 'ab') as fp:
+                    fcntl.flock(fp, fcntl.LOCK_EX)
+                    with gzip.GzipFile(fileobj=fp, mode='wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    fp.flush()
+                    os.fsync(fp.fileno())
+                os.remove(fqfn)
+        except FileNotFoundError:
+            pass
+        except:
+            self._error(traceback.format_exc() + '\n')
+
+    @staticmethod
+    def _linked(fp):
+        """
+        True if 'fp' is still the file at its path (not one removed meanwhile).
+        """
+
+        try:
+            return os.stat(fp.name).st_ino == os.fstat(fp.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _error(self, text):
+        """
+        """
+
+        try:
+            with open(self.Path + time.strftime('%Y_%m_%d', time.gmtime()) + '.err', 'a') as fp:
+                fp.write(text)
+        except:
+            pass
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+import traceback
+
+from bisect import bisect_left
+
+
+class Registry(object):
+    """
+    https://prometheus.io/docs/instrumenting/exposition_formats/
+
+    Counters and (latency) histograms, by name and labels, exported every 'interval' seconds
+    to '/logs/metrics.<name>.prom' (which is ready for the "textfile" collector of the node exporter).
+    """
+
+    Prefix = 'kebnekaise_'
+    Buckets = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60.)
+    Help = {
+        'request_seconds': 'Time spent by each request to an exchange (rate limiting delays not included).',
+        'request_retries_total': 'Failed requests which were tried again.',
+        'request_errors_total': 'Failed requests which ran out of retries.',
+        'throttled_total': 'Responses with the 418 / 429 (too many requests) HTTP status.',
+        'stage_seconds': 'Time spent by each stage of the market analysis.',
+        'symbols_scored_total': 'Symbols scored by the market analysis.',
+        'ledger_reconciliations_total': 'Balances and open orders downloaded again, by reason.',
+    }
+
+    def __init__(self, toolkit, interval=60., name='kebnekaise'):
+        """
+        Constructor method.
+        """
+
+        self.Toolkit = toolkit
+        self.Path = self.Toolkit.Path + '/logs/'
+        self.log = self.Toolkit.log
+        self.Interval, self.Name = interval, name
+
+        self._lock, self._writing = threading.Lock(), threading.Lock()
+        self._pid, self._exported = os.getpid(), time.time()
+        self._counters, self._histograms = {}, {}
+
+    def count(self, name, value=1, **labels):
+        """
+        """
+
+        key = name, tuple(sorted(labels.items()))
+        with self._lock:
+            self._reset()
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._tick()
+
+    def total(self, name, **labels):
+        """
+        The current value of a counter (0 if never counted).
+        """
+
+        with self._lock:
+            self._reset()
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def observe(self, name, value, **labels):
+        """
+        Adds 'value' (usually in seconds) to the histogram.
+        """
+
+        key = name, tuple(sorted(labels.items()))
+        with self._lock:
+            self._reset()
+            tmp = self._histograms.get(key)
+            if tmp is None:
+                tmp = self._histograms[key] = [0] * (len(self.Buckets) + 1) + [0.]
+            tmp[bisect_left(self.Buckets, value)] += 1
+            tmp[-1] += value
+        self._tick()
+
+    def export(self):
+        """
+        Writes everything recorded so far (by this process) at once, replacing the previous file.
+        """
+
+        try:
+            with self._lock:
+                counters = sorted(self._counters.items())
+                histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+
+            lines, typed = [], set()
+            for (name, labels), value in counters:
+                lines += self._type(name, 'counter', typed)
+                lines.append('{0}{1}{2} {3}'.format(self.Prefix, name, self._labels(labels), value))
+
+            for (name, labels), values in histograms:
+                lines += self._type(name, 'histogram', typed)
+                cumulative = 0
+                for bound, value in zip(self.Buckets + ('+Inf',), values):
+                    cumulative += value
+                    lines.append('{0}{1}_bucket{2} {3}'.format(
+                        self.Prefix, name, self._labels(labels + (('le', bound),)), cumulative))
+                lines.append('{0}{1}_sum{2} {3:.6f}'.format(self.Prefix, name, self._labels(labels), values[-1]))
+                lines.append('{0}{1}_count{2} {3}'.format(self.Prefix, name, self._labels(labels), cumulative))
+
+            fqfn = self.Path + 'metrics.' + self.Name + '.prom'
+            os.makedirs(self.Path, exist_ok=True)
+            with self._writing:
+                with open(fqfn + '.tmp', 'w') as fp:
+                    fp.write('\n'.join(lines) + '\n')
+                os.replace(fqfn + '.tmp', fqfn)
+        except:
+            self.log(traceback.format_exc())
+
+    def _tick(self):
+        """
+        """
+
+        with self._lock:
+            due = 0 < self.Interval <= time.time() - self._exported
+            if due:
+                self._exported = time.time()
+        if due:
+            self.export()
+
+    def _reset(self):
+        """
+        A forked process starts from scratch: the parent's figures are still the parent's.
+        """
+
+        if self._pid != os.getpid():
+            self._pid, self._exported = os.getpid(), time.time()
+            self._counters, self._histograms = {}, {}
+
+    def _type(self, name, kind, typed):
+        """
+        """
+
+        if name in typed:
+            return []
+        typed.add(name)
+        tmp = ['# HELP {0}{1} {2}'.format(self.Prefix, name, self.Help[name])] if name in self.Help else []
+        return tmp + ['# TYPE {0}{1} {2}'.format(self.Prefix, name, kind)]
+
+    @staticmethod
+    def _labels(labels):
+        """
+        """
+
+        if len(labels) == 0:
+            return ''
+        return '{' + ','.join('{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                              for k, v in labels) + '}'
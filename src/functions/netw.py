@@ -0,0 +1,603 @@
+import asyncio
+import base64
+import hashlib
+import http.client
+import io
+import os
+import socket
+import socketserver
+import ssl
+import struct
+import threading
+import time
+import traceback
+import zlib
+
+from concurrent import futures
+from urllib import error, parse
+
+
+class Limiter(object):
+    """
+    https://en.wikipedia.org/wiki/Token_bucket
+
+    One of these per exchange, shared by every call made to it (even from different threads):
+    each request takes its cost (or "weight") from the bucket, and waits while it is empty.
+    """
+
+    def __init__(self, capacity, period=1., safety=.9):
+        """
+        Constructor method.
+        """
+
+        self.Capacity = safety * capacity  # never go all the way to the limit, just in case...
+        self.Period = period  # seconds
+        self.Rate = self.Capacity / self.Period
+
+        self._lock = threading.Lock()
+        self._tokens, self._stamp, self._blocked = self.Capacity, time.monotonic(), 0.
+
+    def acquire(self, cost=1):
+        """
+        Takes 'cost' tokens from the bucket, sleeping as long as needed.
+        """
+
+        delay = self.reserve(cost)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def reserve(self, cost=1):
+        """
+        Takes 'cost' tokens from the bucket right away (it may get into debt) and
+        returns how many seconds the caller must wait before actually sending the request.
+        """
+
+        with self._lock:
+            now = self._refill()
+            self._tokens -= cost
+            return max(0., -self._tokens / self.Rate, self._blocked - now)
+
+    def adapt(self, used):
+        """
+        Trusts the exchange: 'used' is the cost it says was spent in the current period
+        (e.g. the 'X-MBX-USED-WEIGHT-1M' header from Binance).
+        """
+
+        try:
+            used = float(used)
+        except (TypeError, ValueError):
+            return
+
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, self.Capacity - used)
+
+    def penalize(self, seconds):
+        """
+        Nothing more goes out for the next 'seconds' (e.g. after an HTTP 429 / 418 response).
+        """
+
+        try:
+            seconds = float(seconds)
+        except (TypeError, ValueError):
+            seconds = self.Period
+
+        with self._lock:
+            self._blocked = max(self._blocked, time.monotonic() + seconds)
+
+    def _refill(self):
+        """
+        """
+
+        now = time.monotonic()
+        self._tokens = min(self.Capacity, self._tokens + (now - self._stamp) * self.Rate)
+        self._stamp = now
+        return now
+
+
+class Transport(object):
+    """
+    https://en.wikipedia.org/wiki/HTTP_persistent_connection
+
+    A (thread-safe) pool of keep-alive HTTPS connections per host, with gzip enabled and timeouts,
+    to be shared by all the plugins instead of opening a brand new connection for each request.
+    """
+
+    def __init__(self, connect_timeout=5., read_timeout=15., pool_size=8):
+        """
+        Constructor method.
+        """
+
+        self.Timeouts = connect_timeout, read_timeout
+        self.PoolSize = pool_size
+        self.Stats = dict.fromkeys(['requests', 'handshakes', 'wire_bytes', 'plain_bytes'], 0)
+
+        self._lock = threading.Lock()
+        self._pid, self._pool = os.getpid(), {}
+
+    def request(self, url, data=None, headers=None, method=None):
+        """
+        Sends the request and returns the response body (as bytes, already decompressed) and headers.
+        Just like 'urllib.request.urlopen()', any HTTP status >= 400 raises an 'HTTPError'.
+        """
+
+        parts = parse.urlsplit(url)
+        target = parts.path + ['', '?' + parts.query][len(parts.query) > 0]
+        method = method or ['GET', 'POST'][data is not None]
+
+        tmp = {'Accept-Encoding': 'gzip, deflate', 'User-Agent': 'Kebnekaise', }
+        if data is not None:
+            tmp['Content-Type'] = 'application/x-www-form-urlencoded'
+        tmp.update(headers or {})
+
+        for attempt in [1, 0]:
+            conn, reused = self._acquire(parts)
+            try:
+                conn.request(method, target, body=data, headers=tmp)
+                response = conn.getresponse()
+                body = self._read(response)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused and attempt:  # the site has just dropped an idle connection, try a new one
+                    continue
+                raise
+            except:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(parts, conn)
+
+            if response.status >= 400:
+                raise error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+            return body, response.headers
+
+    def summary(self):
+        """
+        Just a string with the statistics so far.
+        """
+
+        with self._lock:
+            tmp = dict(self.Stats)
+
+        saved = 100 * (1 - tmp['wire_bytes'] / max(1, tmp['plain_bytes']))
+        return ('{requests} requests, {handshakes} handshakes, {wire_bytes} bytes received '
+                '({plain_bytes} bytes decompressed)'.format(**tmp) + ', {:.2f} % saved.'.format(saved))
+
+    def _acquire(self, parts):
+        """
+        """
+
+        key = parts.scheme, parts.netloc
+        with self._lock:
+            if self._pid != os.getpid():  # never share sockets with the parent process
+                self._pid, self._pool = os.getpid(), {}
+
+            self.Stats['requests'] += 1
+            idle = self._pool.setdefault(key, [])
+            if len(idle) > 0:
+                return idle.pop(), True
+            self.Stats['handshakes'] += 1
+
+        connect_timeout, read_timeout = self.Timeouts
+        if parts.scheme == 'https':
+            conn = http.client.HTTPSConnection(parts.netloc, timeout=connect_timeout)
+        else:
+            conn = http.client.HTTPConnection(parts.netloc, timeout=connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(read_timeout)
+        return conn, False
+
+    def _release(self, parts, conn):
+        """
+        """
+
+        key = parts.scheme, parts.netloc
+        with self._lock:
+            idle = self._pool.setdefault(key, [])
+            if len(idle) < self.PoolSize and self._pid == os.getpid():
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _read(self, response, chunk_size=16384):
+        """
+        Reads the whole body, decompressing it on the fly (as it arrives).
+        """
+
+        encoding = response.headers.get('Content-Encoding', '').lower()
+        decoder = None
+        if encoding == 'gzip':
+            decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            decoder = zlib.decompressobj()
+
+        wire, chunks = 0, []
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                break
+            wire += len(chunk)
+            chunks.append(decoder.decompress(chunk) if decoder else chunk)
+        if decoder:
+            chunks.append(decoder.flush())
+
+        body = b''.join(chunks)
+        with self._lock:
+            self.Stats['wire_bytes'] += wire
+            self.Stats['plain_bytes'] += len(body)
+        return body
+
+
+class Asynchronous(object):
+    """
+    https://docs.python.org/3/library/asyncio-eventloop.html#executing-code-in-thread-or-process-pools
+
+    Async variants of the Wrapper methods: the wrappers themselves are still blocking, so
+    each call runs in a (bounded) thread pool shared by every exchange on the same event loop.
+
+    The Advisor's scans (see 'scan()') are gathered on that 'loop' as well: every history and book
+    download is one of these awaitable calls, instead of a job for a thread pool of each scan.
+    """
+
+    def __init__(self, wrapper, executor=None, loop=None, timeout=3.):
+        """
+        Constructor method.
+        """
+
+        self.Wrapper = wrapper
+        self.Brand = self.Wrapper.Brand
+        self.Toolkit = self.Wrapper.Toolkit
+        self.log = self.Toolkit.log
+        self.Executor = executor
+        self.Loop = loop
+        self.Timeout = timeout
+
+    async def symbols(self, btc_only=True):
+        """
+        """
+
+        return await self.run(self.Wrapper.symbols, btc_only)
+
+    async def ohlcv(self, symbol):
+        """
+        """
+
+        return await self.run(self.Wrapper.ohlcv, symbol)
+
+    async def history(self, symbol, limit=100):
+        """
+        """
+
+        return await self.run(self.Wrapper.history, symbol, limit)
+
+    async def book(self, symbol, margin=1):
+        """
+        """
+
+        return await self.run(self.Wrapper.book, symbol, margin)
+
+    async def balance(self):
+        """
+        """
+
+        return await self.run(self.Wrapper.balance)
+
+    async def orders(self):
+        """
+        """
+
+        return await self.run(self.Wrapper.orders)
+
+    async def status(self, order_id):
+        """
+        """
+
+        return await self.run(self.Wrapper.status, order_id)
+
+    async def fire(self, amount, price, symbol, simulate=False):
+        """
+        """
+
+        return await self.run(self.Wrapper.fire, amount, price, symbol, simulate)
+
+    async def cancel(self, order_id):
+        """
+        """
+
+        return await self.run(self.Wrapper.cancel, order_id)
+
+    async def run(self, func, *args):
+        """
+        Runs any blocking function (not only the ones above) without blocking the event loop.
+        """
+
+        return await asyncio.get_running_loop().run_in_executor(self.Executor, func, *args)
+
+    async def gather(self, symbols, workers, func, until=None, then=None, args=()):
+        """
+        Same as 'Advisor._scan()': up to 'workers' calls of 'func(symbol, *args)' in flight at once (by their
+        async variants above, if 'func' is a Wrapper method), 'then(symbol, result)' for each result as soon as
+        it arrives, and no more symbols started once 'until(next_symbol)' is true.
+        """
+
+        if getattr(func, '__self__', None) is self.Wrapper and hasattr(type(self), func.__name__):
+            call = getattr(self, func.__name__)
+        else:
+            call = lambda s, *a: self.run(func, s, *a)
+
+        scores, semaphore = {}, asyncio.Semaphore(workers)
+
+        async def one(s):
+            try:
+                scores[s] = await call(s, *args)
+                if then is not None:
+                    then(s, scores[s])
+            finally:
+                semaphore.release()
+
+        tasks = []
+        for s in symbols:
+            await semaphore.acquire()
+            if self.Toolkit.halt() or (until is not None and until(s)):
+                semaphore.release()
+                break
+            tasks.append(asyncio.ensure_future(one(s)))
+
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                self.log(''.join(traceback.format_exception(type(result), result, result.__traceback__)), self)
+        return scores
+
+    def scan(self, symbols, workers, func, until=None, then=None, args=()):
+        """
+        'gather()' for blocking code (e.g. 'Advisor.broadway()', itself run in the executor): it waits for
+        the results, so never call it from the event loop's own thread. Once halted, it stops waiting
+        (within 'timeout' seconds): the loop may be shutting down already.
+        """
+
+        future = asyncio.run_coroutine_threadsafe(self.gather(symbols, workers, func, until, then, args), self.Loop)
+        while True:
+            try:
+                return future.result(self.Timeout)
+            except futures.TimeoutError:
+                if self.Toolkit.halt():
+                    future.cancel()
+                    return {}
+
+
+class WebSocket(object):
+    """
+    https://tools.ietf.org/html/rfc6455
+
+    Just enough of the protocol for reading market streams (as a client), or for
+    replaying them (as a server, see 'Replay' below): text frames, fragmentation, ping/pong and close.
+    """
+
+    Magic = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    def __init__(self, url, timeout=15.):
+        """
+        Constructor method.
+        """
+
+        self.Url = url
+        self.Timeout = timeout
+        self.Masked = True  # clients MUST mask their frames, servers MUST NOT.
+
+        self._sock, self._file = None, None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """
+        Opens the connection and makes the opening handshake (as a client).
+        """
+
+        parts = parse.urlsplit(self.Url)
+        port = parts.port or [80, 443][parts.scheme == 'wss']
+        sock = socket.create_connection((parts.hostname, port), self.Timeout)
+        if parts.scheme == 'wss':
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+
+        key = base64.b64encode(os.urandom(16))
+        target = (parts.path or '/') + ['', '?' + parts.query][len(parts.query) > 0]
+        sock.sendall('\r\n'.join([
+            'GET {} HTTP/1.1'.format(target),
+            'Host: {}'.format(parts.netloc),
+            'Upgrade: websocket',
+            'Connection: Upgrade',
+            'Sec-WebSocket-Key: {}'.format(key.decode()),
+            'Sec-WebSocket-Version: 13',
+            '', '']).encode())
+
+        self._sock, self._file = sock, sock.makefile('rb')
+        headers = self._headers()
+        accept = base64.b64encode(hashlib.sha1(key + self.Magic).digest()).decode()
+        if not headers[0].split()[1:2] == ['101'] or headers[1].get('sec-websocket-accept') != accept:
+            self.close()
+            raise ConnectionError('WebSocket handshake failed: ' + headers[0])
+        return self
+
+    def accept(self, sock):
+        """
+        Makes the opening handshake as a server, over an already accepted 'sock'.
+        """
+
+        self.Masked = False
+        self._sock, self._file = sock, sock.makefile('rb')
+
+        _, headers = self._headers()
+        accept = base64.b64encode(hashlib.sha1(headers['sec-websocket-key'].encode() + self.Magic).digest())
+        sock.sendall('\r\n'.join([
+            'HTTP/1.1 101 Switching Protocols',
+            'Upgrade: websocket',
+            'Connection: Upgrade',
+            'Sec-WebSocket-Accept: {}'.format(accept.decode()),
+            '', '']).encode())
+        return self
+
+    def send(self, message, opcode=0x1):
+        """
+        Sends a whole message in a single frame.
+        """
+
+        payload = [message, message.encode()][type(message) == str]
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, (0x80 if self.Masked else 0) | length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, (0x80 if self.Masked else 0) | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, (0x80 if self.Masked else 0) | 127, length)
+
+        if self.Masked:
+            mask = os.urandom(4)
+            header += mask
+            payload = self._unmask(payload, mask)
+
+        with self._lock:
+            self._sock.sendall(header + payload)
+
+    def recv(self):
+        """
+        Returns the next (text) message, answering pings along the way.
+        A closed connection raises 'ConnectionError'.
+        """
+
+        fragments = []
+        while True:
+            fin, opcode, payload = self._frame()
+
+            if opcode == 0x8:
+                self.close()
+                raise ConnectionError('WebSocket closed by the other side.')
+            elif opcode == 0x9:
+                self.send(payload, 0xA)
+            elif opcode in [0x0, 0x1, 0x2]:
+                fragments.append(payload)
+                if fin:
+                    return b''.join(fragments).decode()
+
+    def close(self):
+        """
+        """
+
+        for closable in [self._file, self._sock]:
+            try:
+                if closable is not None:
+                    closable.close()
+            except OSError:
+                pass
+        self._sock, self._file = None, None
+
+    def _frame(self):
+        """
+        """
+
+        head = self._exactly(2)
+        fin, opcode = head[0] & 0x80, head[0] & 0x0F
+        masked, length = head[1] & 0x80, head[1] & 0x7F
+
+        if length == 126:
+            length = struct.unpack('!H', self._exactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self._exactly(8))[0]
+
+        mask = self._exactly(4) if masked else None
+        payload = self._exactly(length)
+        if mask is not None:
+            payload = self._unmask(payload, mask)
+        return fin, opcode, payload
+
+    def _exactly(self, size):
+        """
+        """
+
+        data = self._file.read(size)
+        if len(data) < size:
+            raise ConnectionError('WebSocket connection lost.')
+        return data
+
+    def _headers(self):
+        """
+        """
+
+        lines = []
+        while True:
+            line = self._file.readline(65536)
+            if line in [b'', b'\r\n', b'\n']:
+                break
+            lines.append(line.decode().strip())
+
+        if len(lines) == 0:
+            raise ConnectionError('WebSocket handshake failed: nothing received.')
+        return lines[0], {k.strip().lower(): v.strip() for k, _, v in
+                          (line.partition(':') for line in lines[1:])}
+
+    def _unmask(self, payload, mask):
+        """
+        """
+
+        length = len(payload)
+        key = int.from_bytes((mask * (length // 4 + 1))[:length], 'big')
+        return (int.from_bytes(payload, 'big') ^ key).to_bytes(length, 'big')
+
+
+class Replay(object):
+    """
+    A local stand-in for a market stream (e.g. while testing): every client connected gets the
+    recorded messages in 'archive' (one per line), right after sending its first (subscription) message.
+    """
+
+    def __init__(self, archive, host='127.0.0.1', port=0, interval=0.):
+        """
+        Constructor method.
+        """
+
+        with open(archive) as fp:
+            self.Messages = [line.strip() for line in fp if len(line.strip()) > 0]
+        self.Interval = interval
+
+        replay = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                replay._serve(self.request)
+
+        self.Server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.Server.daemon_threads = True
+        self.Url = 'ws://{0}:{1}/stream'.format(*self.Server.server_address)
+        self._thread = None
+
+    def start(self):
+        """
+        """
+
+        self._thread = threading.Thread(target=self.Server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        """
+
+        self.Server.shutdown()
+        self.Server.server_close()
+
+    def _serve(self, sock):
+        """
+        """
+
+        ws = WebSocket(self.Url).accept(sock)
+        try:
+            ws.recv()
+            for message in self.Messages:
+                ws.send(message)
+                time.sleep(self.Interval)
+            while True:
+                ws.recv()
+        except (ConnectionError, OSError):
+            ws.close()
@@ -1,7 +1,12 @@
-import random
+import heapq
 import time
 import traceback
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from operator import itemgetter
+
+from .tsdb import Store
+
 
 class Advisor(object):
     """
@@ -16,7 +21,13 @@ class Advisor(object):
         self.Database = database
         self.Wrapper = self.Database.Wrapper
         self.Brand = self.Wrapper.Brand
-        self._cache = {}
+        self._cache, self._tickers = {}, {}
+        self._podium = Podium(5, self._eligible)
+        self.Asynchronous = None  # a 'netw.Asynchronous' (in the 'asyncio' runtime): scans become coroutines.
+
+        self.Trades = None
+        if self.Database.Toolkit.setup().get('store_trades', 'no').lower() == 'yes':
+            self.Trades = Store(self.Wrapper)
 
         self.Toolkit = self.Wrapper.Toolkit
         self.log = self.Toolkit.log
@@ -27,22 +38,31 @@ class Advisor(object):
         https://www.pokernews.com/pokerterms/broadway.htm
         """
 
+        started = time.time()
         try:
-            self._update(self.Wrapper.symbols())
+            symbols = self.Wrapper.symbols()
+            self._update(symbols)
             data = self._cache['data']
+            if symbols is not None:  # (only the listed ones, whatever the cache still has)
+                listed = set(symbols)
+                data = {s: i for s, i in data.items() if s in listed}
 
             self.log('Starting analysis of market data...', self)
             t_delta = time.time()
 
             excl_bases = {b for (b, q), i in data.items() if i < 11 or 'usd' in b}
             bw = {(b, q): i for (b, q), i in data.items() if b not in excl_bases}
-            self.log('Primary selection is: ' + str(sorted(bw)), self)
+            self.log('Primary selection is: {}', self, args=(sorted(bw),))
 
             bw = {s: int(1E3 * i) for s, i in bw.items()}
-            bw = dict(sorted(bw.items(), key=lambda k: k[1])[-5:])
+            bw = dict(sorted(heapq.nlargest(5, bw.items(), key=itemgetter(1)), key=itemgetter(1)))
 
             bw = [bw, {}][len(bw) < 3]
-            self.log('FINAL selection is: ' + str(bw), self)
+            self.log('FINAL selection is: {}', self, args=(bw,))
+
+            if self.Toolkit.Bus is not None:
+                self.Toolkit.Bus.publish(self.Brand, {s: self._tickers[s] + (i,) for s, i in data.items()
+                                                      if i > 0 and s in self._tickers})
 
             t_delta = time.time() - t_delta
             self.log('...done in {:.8f} seconds.'.format(t_delta), self)
@@ -50,11 +70,27 @@ class Advisor(object):
 
         except:
             self.log(traceback.format_exc(), self)
+        finally:
+            self.Toolkit.Metrics.observe('stage_seconds', time.time() - started,
+                                         exchange=self.Brand, stage='broadway')
+
+    def provisional(self):
+        """
+        The best (up to 5) symbols scored so far, even in the middle of an analysis, in the same format
+        of the 'broadway()' selection (but without its minimum size).
+        """
+
+        try:
+            return {s: int(1E3 * i) for s, i in self._podium.selection()}
+        except:
+            self.log(traceback.format_exc(), self)
+            return {}
 
     def _update(self, symbols):
         """
         """
 
+        started = time.time()
         try:
             assert symbols is not None
 
@@ -62,58 +98,261 @@ class Advisor(object):
             assert ls > 0
 
             rs = max(10, int(ls / 10))
-            t_delta = time.time()
+            t_delta, now = time.time(), self.Toolkit.clock()
 
             self._cache = self.Database.query(self)
-            if 'data' in self._cache and t_delta - self._cache['last'] < 3600:
-                self.log('{0} available symbols: randomly testing {1} of them...'.format(ls, rs), self)
-                top5 = set(dict(sorted(self._cache['data'].items(), key=lambda k: k[1])[-5:]))
-                rsymbols = set(random.sample(symbols - top5, rs - 5))
-                target_set = rsymbols | top5
+            if 'data' not in self._cache:
+                self._cache = {'data': {}, 'last': now}
+            self._cache.setdefault('scored', dict.fromkeys(self._cache['data'], self._cache['last']))
+            self._cache.setdefault('swing', {})
+            self._cache['last'] = now
+
+            listed = set(symbols)  # (delisted or frozen symbols must not keep their last scores forever)
+            for key in ('data', 'scored', 'swing'):
+                self._cache[key] = {s: i for s, i in self._cache[key].items() if s in listed}
+
+            target_set = self._schedule(symbols, rs, now)
+            self.log('{0} available symbols: testing {1} of them...'.format(ls, len(target_set)), self)
+
+            target_set, hopeless = self._prefilter(target_set)
+            self._cache['data'].update(dict.fromkeys(hopeless, 0.))
+            self._cache['scored'].update(dict.fromkeys(hopeless, now))
+
+            bounds = self._bounds(target_set, now)
+            self._podium.clear()
+            for s, i in self._cache['data'].items():
+                if s not in target_set:
+                    self._podium.push(s, i)
+
+            until = None
+            if self.Toolkit.setup().get('anytime_selection', 'no').lower() == 'yes':
+                target_set = sorted(target_set, key=bounds.get, reverse=True)
+                until = lambda s: self._podium.settled(bounds[s])
+
+            workers = int(self.Toolkit.setup().get('scan_workers', 1))
+            if self.Toolkit.setup().get('batch_scoring', 'no').lower() == 'yes':
+                scores = self._batch(target_set, workers)
+                for s, i in scores.items():
+                    self._podium.push(s, i)
+            elif workers > 1:
+                scores = self._scan(target_set, workers, until=until, then=self._podium.push)
             else:
-                self.log('Testing all {0} available symbols...'.format(ls), self)
-                self._cache = {'data': {}, 'last': t_delta}
-                target_set = symbols
+                scores = {}
+                for s in target_set:
+                    if self.Toolkit.halt() or (until is not None and until(s)):
+                        break
+                    scores[s] = self._index(s)
+                    self._podium.push(s, scores[s])
+
+            if until is not None and len(scores) < len(target_set) and not self.Toolkit.halt():
+                self.log('Stopped after {0} of {1} symbols: the best ones can\'t change anymore.'
+                         .format(len(scores), len(target_set)), self)
 
-            self._cache['data'].update({s: self._index(s) for s in target_set
-                                        if not self.Toolkit.halt()})
+            for s, score in scores.items():
+                previous = self._cache['data'].get(s)
+                if score is not None and previous is not None:
+                    swing = self._cache['swing'].get(s, 0.)
+                    self._cache['swing'][s] = swing + (abs(score - previous) - swing) / 2
+            self._cache['scored'].update(dict.fromkeys(scores, now))
+            self._cache['data'].update(scores)
             self.Database.query(self, self._cache)
+            self.Toolkit.Metrics.count('symbols_scored_total', len(scores), exchange=self.Brand)
 
             t_delta = time.time() - t_delta
-            av_delta = t_delta / len(target_set)
-            self.log('...done in {:.8f} s, average {:.8f} s/symbol.'
-                     .format(t_delta, av_delta), self)
+            if len(scores) > 0:
+                self.log('...done in {:.8f} s, average {:.8f} s/symbol ({:.2f} symbols/s).'
+                         .format(t_delta, t_delta / len(scores), len(scores) / t_delta), self)
+            else:
+                self.log('...done in {:.8f} s, no symbols scored (0 symbols/s).'.format(t_delta), self)
+            self.log('(HTTP: {})'.format(self.Toolkit.Transport.summary()), self, 0)
 
         except AssertionError:
             return
         except:
             self.log(traceback.format_exc(), self)
+        finally:
+            self.Toolkit.Metrics.observe('stage_seconds', time.time() - started,
+                                         exchange=self.Brand, stage='update')
+
+    def _schedule(self, symbols, budget, now, max_age=3600):
+        """
+        https://en.wikipedia.org/wiki/Priority_queue
+
+        The symbols worth refreshing the most (up to 'budget' of them, besides the never scored ones):
+        the expected value of doing so grows with the last score, its usual swings and the time since then.
+        Anything older than 'max_age' seconds comes first.
+        """
+
+        try:
+            data, scored, swing = self._cache['data'], self._cache['scored'], self._cache['swing']
+            fresh = {s for s in symbols if s not in scored}
+
+            def priority(s):
+                age = now - scored[s]
+                if age > max_age:
+                    return float('inf')
+                return (1 + (data.get(s) or 0.) + swing.get(s, 0.)) * age
+
+            return fresh | set(heapq.nlargest(max(0, budget - len(fresh)), set(symbols) - fresh, key=priority))
+
+        except:
+            self.log(traceback.format_exc(), self)
+            return set(symbols)
+
+    def _bounds(self, symbols, now, max_age=3600):
+        """
+        Optimistic guesses of the best score each symbol could get now: the last one plus a few of its usual
+        swings (see '_schedule()'). The ones without any swing known yet, or scored too long ago, may get anything.
+        """
+
+        data, scored, swing = self._cache['data'], self._cache['scored'], self._cache['swing']
+        return {s: (data.get(s) or 0.) + 3 * swing[s] if s in swing and now - scored.get(s, 0) <= max_age
+                else float('inf') for s in symbols}
+
+    @staticmethod
+    def _eligible(symbol, score):
+        """
+        Whether a symbol may ever be chosen by 'broadway()'.
+        """
+
+        return score is not None and score >= 11 and 'usd' not in symbol[0]
+
+    def _prefilter(self, symbols, min_volume=1.):
+        """
+        Discards, by using a single (all markets) request, the symbols which certainly would fail
+        the tests at '_index()': too wide spreads, too few trades or (24h) volume under 'min_volume'.
+        """
+
+        try:
+            summaries = self.Wrapper.summaries()
+            assert summaries is not None
+
+            hopeless = set()
+            for s in symbols:
+                if s in summaries:
+                    l_ask, h_bid, volume, frequency = summaries[s]
+                    if h_bid <= 0 or 100 * (l_ask / h_bid - 1) >= 1 or volume < min_volume:
+                        hopeless.add(s)
+                    elif frequency is not None and frequency <= 60:
+                        hopeless.add(s)
+
+            self.log('Prefilter discarded {0} of {1} symbols.'.format(len(hopeless), len(symbols)), self)
+            return set(symbols) - hopeless, hopeless
+
+        except AssertionError:
+            return symbols, set()
+        except:
+            self.log(traceback.format_exc(), self)
+            return symbols, set()
+
+    def _scan(self, symbols, workers, func=None, until=None, then=None, args=()):
+        """
+        Same as indexing (or any other 'func(symbol, *args)') one symbol after another, but keeping up to 'workers'
+        of them in flight at once, so the (blocking) history and book downloads of different symbols overlap.
+
+        Every result is also given to 'then(symbol, result)' as soon as it arrives, and no more symbols are
+        started once 'until(next_symbol)' is true.
+        """
+
+        func = func or self._index
+
+        scores, running = {}, {}
+        pending = iter(symbols)
+
+        try:
+            if self.Asynchronous is not None:
+                return self.Asynchronous.scan(symbols, workers, func, until, then, args)
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                while True:
+                    while len(running) < workers and not self.Toolkit.halt():
+                        s = next(pending, None)
+                        if s is None or (until is not None and until(s)):
+                            pending = iter([])
+                            break
+                        running[pool.submit(func, s, *args)] = s
+
+                    if len(running) == 0:
+                        break
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        s = running.pop(f)
+                        scores[s] = f.result()
+                        if then is not None:
+                            then(s, scores[s])
+            return scores
+
+        except:
+            self.log(traceback.format_exc(), self)
+            return scores
+
+    def _batch(self, symbols, workers, market_depth=5):
+        """
+        Same results of '_index()', but all the symbols are scored at once (see 'Toolkit.indexes()'):
+        first every history is downloaded, then the books of the frequent enough symbols only.
+        """
+
+        started = time.time()
+        try:
+            histories = self._scan(symbols, workers, self.Wrapper.history)
+            if self.Trades is not None:
+                for s, history in histories.items():
+                    if history is not None:
+                        self.Trades.append(s, history)
+            ordered = list(histories)
+            frequencies = self.Toolkit.indexes([histories[s] for s in ordered], [None] * len(ordered))['frequency']
+
+            frequent = [s for s, f in zip(ordered, frequencies) if f > 60]
+            books = self._scan(frequent, workers, self.Wrapper.book, args=(market_depth,))
+
+            ordered = [s for s in ordered if s in books or s not in frequent]  # (unless halted meanwhile)
+            indexes = self.Toolkit.indexes([histories[s] for s in ordered],
+                                           [books.get(s) for s in ordered], market_depth)
+            self._tickers.update({s: (float(a), float(b)) for s, a, b in
+                                  zip(ordered, indexes['l_ask'], indexes['h_bid']) if a == a and b == b})
+            return {s: float(i) for s, i in zip(ordered, indexes['score'])}
+
+        except:
+            self.log(traceback.format_exc(), self)
+            return {}
+        finally:
+            self.Toolkit.Metrics.observe('stage_seconds', time.time() - started,
+                                         exchange=self.Brand, stage='batch')
 
     def _index(self, symbol, market_depth=5):
         """
         """
 
+        started = time.time()
         try:
             history = self.Wrapper.history(symbol)
             assert history is not None
             assert len(history) > 0
 
+            if self.Trades is not None:
+                self.Trades.append(symbol, history)
+
             epochs = set(list(zip(*history))[0])
             hours = [(max(epochs) - min(epochs)) / 3600, 1 / 3600][len(epochs) == 1]
             frequency = len(history) / hours
             assert frequency > 60
 
-            book = self.Wrapper.book(symbol, market_depth)
-            assert book is not None
-            assert len(book) > 0
+            if hasattr(self.Wrapper, 'ticker'):  # no book copied at all (e.g. from a Binance local book).
+                ticker = self.Wrapper.ticker(symbol, market_depth)
+            else:
+                book = self.Wrapper.book(symbol, market_depth)
+                assert book is not None
+                assert len(book) > 0
 
-            ticker = self.Toolkit.ticker(book, market_depth)
+                ticker = self.Toolkit.ticker(book, market_depth)
             assert ticker is not None
 
             l_ask, h_bid, (l_ask_weight, h_bid_weight, buy_pressure) = ticker
             assert buy_pressure > 5
 
             spread = 100 * (l_ask / h_bid - 1)
+            self._tickers[symbol] = l_ask, h_bid
             assert spread < 1
 
             return self.Toolkit.smooth(frequency * buy_pressure / spread)
@@ -122,3 +361,57 @@ class Advisor(object):
             return 0.
         except:
             self.log(traceback.format_exc(), self)
+        finally:
+            self.Toolkit.Metrics.observe('stage_seconds', time.time() - started,
+                                         exchange=self.Brand, stage='index')
+
+
+class Podium(object):
+    """
+    https://en.wikipedia.org/wiki/Partial_sorting
+
+    The best 'size' (eligible) scores seen so far, kept in a min-heap as they stream in: the worst
+    of them is always at hand, so it's cheap to tell whether anything else could still get in.
+    """
+
+    def __init__(self, size=5, eligible=None):
+        """
+        Constructor method.
+        """
+
+        self.Size = size
+        self.Eligible = eligible or (lambda symbol, score: score is not None)
+        self._heap = []
+
+    def clear(self):
+        """
+        """
+
+        self._heap = []
+
+    def push(self, symbol, score):
+        """
+        Each symbol should be pushed once (since the last 'clear()').
+        """
+
+        if not self.Eligible(symbol, score):
+            return
+        if len(self._heap) < self.Size:
+            heapq.heappush(self._heap, (score, symbol))
+        elif score > self._heap[0][0]:
+            heapq.heapreplace(self._heap, (score, symbol))
+
+    def settled(self, bound):
+        """
+        Whether the selection is full and nothing scoring up to 'bound' could change it anymore.
+        """
+
+        heap = self._heap
+        return len(heap) == self.Size and heap[0][0] >= bound
+
+    def selection(self):
+        """
+        The (symbol, score) pairs, from the worst to the best.
+        """
+
+        return [(s, i) for i, s in sorted(list(self._heap))]
@@ -21,6 +21,8 @@ class Trader(object):
         self.Brand = self.Wrapper.Brand
         self._tracked = {}
 
+        self.Ledger = Ledger(self.Wrapper)
+        self.Oracle = Oracle(self.Wrapper)
         self.Toolkit = self.Wrapper.Toolkit
         self.log = self.Toolkit.log
         self.log(self.Toolkit.Greeting, self)
@@ -83,24 +85,8 @@ class Trader(object):
             orders = self._flush(orders)
             assert orders is not None
 
-            nakamoto = self.Toolkit.ticker(self.Brand, ('btc', 'usdt'))
-            assert nakamoto is not None
-
-            holdings = {}
-            for currency, (available, on_orders) in balance.items():
-                subtotal = available + on_orders
-                holdings[currency] = [0., 0.]
-
-                if currency == 'btc':
-                    holdings[currency] = [subtotal, subtotal * nakamoto[1]]
-                elif currency == 'usdt':
-                    holdings[currency] = [subtotal / nakamoto[0], subtotal]
-                else:
-                    ticker = self.Toolkit.ticker(self.Brand, (currency, 'btc'))
-                    assert ticker is not None
-
-                    btctotal = subtotal * ticker[1]
-                    holdings[currency] = [btctotal, btctotal * nakamoto[1]]
+            holdings = self.Oracle.value(balance)
+            assert holdings is not None
 
             fee = 1 - self.Wrapper.Fee / 100
             holdings_btc, holdings_usdt = list(zip(*holdings.values()))
@@ -127,22 +113,24 @@ class Trader(object):
             self.log('Checking for altcoin balances not involved in ALIVE orders.', self)
             t_delta = time.time()
 
-            symbols = self.Wrapper.symbols()
+            symbols = self.Ledger.symbols()
             assert symbols is not None
 
-            balance = self.Wrapper.balance()
+            balance = self.Ledger.balance()
             assert balance is not None
 
-            orders = self.Wrapper.orders()
+            orders = self.Ledger.orders()
             assert orders is not None
 
             c, engaged = 0, {s[0] for a, p, s in orders.values()}
+            prices = self.Oracle.prices() or {}
             for currency, (available, _) in balance.items():
                 if currency not in engaged:
                     symbol = currency, 'btc'
 
-                    if symbol in symbols:
-                        ticker = self.Toolkit.ticker(self.Brand, symbol)
+                    # dust (by the all markets prices) isn't worth downloading its book.
+                    if symbol in symbols and (symbol not in prices or available * prices[symbol][1] > 1E-3):
+                        ticker = self.Toolkit.ticker(self.Wrapper.book(symbol))
                         assert ticker is not None
 
                         l_ask, h_bid, _ = ticker
@@ -157,7 +145,7 @@ class Trader(object):
                             self.log('(Order # {} created).'.format(oid), self)
                             c += 1
             if c > 0:
-                orders = self.Wrapper.orders()
+                orders = self.Ledger.orders()
                 assert orders is not None
 
             t_delta = time.time() - t_delta
@@ -177,17 +165,17 @@ class Trader(object):
 
         try:
             self.log('Checking for OUTDATED ({}+ minutes old) orders...'.format(stop_loss), self)
-            t_delta = time.time()
+            t_delta, now = time.time(), self.Toolkit.clock()
 
             c = 0
             for oid, (amount, price, symbol) in orders.items():
                 if oid in self._tracked:
-                    if t_delta - self._tracked[oid] > 60 * stop_loss:
+                    if now - self._tracked[oid] > 60 * stop_loss:
                         self.log('Outdated order # {} found, cancelling now...'.format(oid), self)
-                        self.Wrapper.cancel(oid)
+                        self.Ledger.cancelled(oid, self.Wrapper.cancel(oid))
                         del self._tracked[oid]
 
-                        ticker = self.Toolkit.ticker(self.Brand, symbol)
+                        ticker = self.Toolkit.ticker(self.Wrapper.book(symbol))
                         assert ticker is not None
 
                         l_ask, h_bid, _ = ticker
@@ -199,10 +187,10 @@ class Trader(object):
                         self.log('(Order # {} created).'.format(oid), self)
                         c += 1
                 else:
-                    self._tracked[oid] = t_delta
+                    self._tracked[oid] = now
 
             if c > 0:
-                orders = self.Wrapper.orders()
+                orders = self.Ledger.orders()
                 assert orders is not None
 
             t_delta = time.time() - t_delta
@@ -237,9 +225,10 @@ class Trader(object):
                 buy_price, oid = buying
 
                 self.log('The effective BUY price was: {:.8f}'.format(buy_price), self)
-                time.sleep(1)
+                status = self.Toolkit.track(self.Wrapper, oid, timeout=5.)
+                self.Ledger.update(oid, status)
 
-                if oid not in self.Wrapper.orders():
+                if status is not None and status[0] == 'filled':
                     fix = 1 + 2 * self.Wrapper.Fee / 100
                     selling = self._selling(chosen, fix * buy_price)
                     assert selling is not None
@@ -251,7 +240,7 @@ class Trader(object):
                     profit_goal = 100 * (sell_price / buy_price - fix)
                 else:
                     self.log('BUY routine FAILED, sorry...', self)
-                    self.Wrapper.cancel(oid)
+                    self.Ledger.cancelled(oid, self.Wrapper.cancel(oid))
                 self.log('TRADE PROCEDURES DONE FOR {} ...'.format(chosen), self)
             else:
                 self.log('Apparently all of your funds are engaged ' +
@@ -261,7 +250,7 @@ class Trader(object):
         except AssertionError:
             self.log('Unexpected error while trading {}, sorry...'.format(chosen), self)
 
-            orders = list(self.Wrapper.orders().items())
+            orders = list(self.Ledger.orders(True).items())
             self.log('(Current open orders are: {})'.format(orders), self, 0)
             return
         except:
@@ -280,7 +269,7 @@ class Trader(object):
             assert quote in balance
             assert balance[quote][0] > self.Toolkit.Quota
 
-            ticker = self.Toolkit.ticker(self.Brand, symbol)
+            ticker = self.Toolkit.ticker(self.Wrapper.book(symbol))
             assert ticker is not None
 
             l_ask, h_bid, stats = ticker
@@ -296,9 +285,10 @@ class Trader(object):
             self.log('Trying to BUY {0} by using parameters: {1} ...'.format(symbol, params), self, 0)
 
             buying = self.Wrapper.fire(**params)
+            self.Ledger.fired(buying, **params)
             assert buying is not None
 
-            order_id, price = buying
+            order_id, price, _ = buying
             return price, order_id
 
         except AssertionError:
@@ -315,7 +305,7 @@ class Trader(object):
             base, quote = symbol
             assert quote == 'btc'
 
-            balance = self.Wrapper.balance()
+            balance = self.Ledger.balance()
             assert balance is not None
             assert base in balance
 
@@ -329,12 +319,283 @@ class Trader(object):
             self.log('Trying to SELL {0} by using parameters: {1} ...'.format(symbol, params), self, 0)
 
             selling = self.Wrapper.fire(**params)
+            self.Ledger.fired(selling, **params)
             assert selling is not None
 
-            order_id, price = selling
+            order_id, price, _ = selling
             return price, order_id
 
         except AssertionError:
             return
         except:
             self.log(traceback.format_exc(), self)
+
+
+class Ledger(object):
+    """
+    https://en.wikipedia.org/wiki/General_ledger
+
+    Balances and open orders as they should be by now: updated locally from the results of our own orders,
+    and reconciled with the site (a few signed requests) only every 'period' seconds or when they drift apart.
+    """
+
+    def __init__(self, wrapper, period=300):
+        """
+        Constructor method.
+        """
+
+        self.Wrapper = wrapper
+        self.Brand = self.Wrapper.Brand
+        self.Period = period
+
+        self.Toolkit = self.Wrapper.Toolkit
+        self.log = self.Toolkit.log
+
+        self._symbols, self._balance, self._orders = None, None, None
+        self._executed, self._checked, self._drift = {}, 0, True
+
+    def symbols(self, ttl=3600):
+        """
+        """
+
+        try:
+            if self._symbols is None or self.Toolkit.clock() - self._symbols[0] > ttl:
+                symbols = self.Wrapper.symbols()
+                assert symbols is not None
+                self._symbols = self.Toolkit.clock(), symbols
+            return self._symbols[1]
+
+        except AssertionError:
+            return
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def balance(self, reconcile=False):
+        """
+        {currency: (available, on_orders)}, just like 'Wrapper.balance()'.
+        """
+
+        try:
+            assert self._reconcile(reconcile)
+            return dict(self._balance)
+
+        except AssertionError:
+            return
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def orders(self, reconcile=False):
+        """
+        {order_id: (remaining signed amount, price, symbol)}, just like 'Wrapper.orders()'.
+        """
+
+        try:
+            assert self._reconcile(reconcile)
+            return dict(self._orders)
+
+        except AssertionError:
+            return
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def fired(self, result, amount, price, symbol):
+        """
+        A new order ('result' is whatever 'Wrapper.fire()' returned): its funds are on orders from now on.
+        The amount accepted by the site (e.g. rounded to its lot size) is the one recorded, not the one asked.
+        """
+
+        try:
+            if result is None or self._balance is None:
+                self._drift = True  # maybe insufficient funds, for instance.
+                return
+
+            order_id, price, amount = result
+            base, quote = symbol
+            currency, value = [(base, -amount), (quote, amount * price)][amount > 0]
+            self._move(currency, -value, value)
+            self._orders[order_id] = amount, price, symbol
+            self._executed[order_id] = 0.
+
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def cancelled(self, order_id, result=True, status=None):
+        """
+        The remaining funds of a canceled order are available again ('result' is whatever 'Wrapper.cancel()' returned),
+        once its last fills (from 'status', or asked to the site right now) are applied.
+        """
+
+        try:
+            if result in [0, '', None] or self._orders is None or order_id not in self._orders:
+                self._drift = True
+                return
+
+            if order_id in self._executed:
+                status = status or self.Wrapper.status(order_id)
+                if status is None:
+                    self._drift = True
+                else:
+                    self._fill(order_id, status[1])
+            else:
+                self._drift = True  # fills since the last reconciliation are unknown: better download it all.
+
+            amount, price, (base, quote) = self._orders.pop(order_id)
+            self._executed.pop(order_id, None)
+            currency, value = [(base, -amount), (quote, amount * price)][amount > 0]
+            self._move(currency, value, -value)
+
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def update(self, order_id, status):
+        """
+        Applies the fills (and the final state) reported by 'Wrapper.status()' / 'Toolkit.track()'.
+        """
+
+        try:
+            if status is None or self._orders is None or order_id not in self._executed:
+                self._drift = True  # fills since the last reconciliation are unknown: better download it all.
+                return
+
+            state, executed = status
+            self._fill(order_id, executed)
+
+            if state == 'filled':
+                self._orders.pop(order_id)
+                self._executed.pop(order_id, None)
+            elif state == 'cancelled':
+                self.cancelled(order_id, status=status)
+
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def _fill(self, order_id, executed):
+        """
+        Moves whatever was executed (in total, so far) and not applied yet from an order into the balance.
+        """
+
+        amount, price, (base, quote) = self._orders[order_id]
+        fee = 1 - self.Wrapper.Fee / 100
+
+        filled = executed - self._executed.get(order_id, 0.)
+        if filled > 0:
+            sign = [-1, 1][amount > 0]
+            if amount > 0:
+                self._move(quote, 0., -filled * price)
+                self._move(base, fee * filled, 0.)
+            else:
+                self._move(base, 0., -filled)
+                self._move(quote, fee * filled * price, 0.)
+            self._orders[order_id] = amount - sign * filled, price, (base, quote)
+            self._executed[order_id] = executed
+
+    def _move(self, currency, available, on_orders):
+        """
+        """
+
+        before = self._balance.get(currency, (0., 0.))
+        self._balance[currency] = before[0] + available, before[1] + on_orders
+        if min(self._balance[currency]) < -1E-8:
+            self._drift = True  # we've certainly missed something.
+
+    def _reconcile(self, force=False):
+        """
+        Downloads the actual balance and open orders, if it's time to (or if anything seems wrong).
+        """
+
+        if not (force or self._drift or self.Toolkit.clock() - self._checked > self.Period):
+            return True
+
+        balance = self.Wrapper.balance()
+        orders = self.Wrapper.orders()
+        if balance is None or orders is None:
+            return self._balance is not None
+
+        if not self._drift and self._balance is not None:
+            missed = {c for c in set(balance) | set(self._balance)
+                      if abs(sum(balance.get(c, (0., 0.))) - sum(self._balance.get(c, (0., 0.)))) > 1E-8}
+            if len(missed) > 0:
+                self.log('Ledger reconciled, it was missing changes of: ' + str(sorted(missed)), self)
+
+        self.Toolkit.Metrics.count('ledger_reconciliations_total', exchange=self.Brand,
+                                   reason=['period', 'drift'][self._drift])
+        self._balance, self._orders, self._executed = dict(balance), dict(orders), {}
+        self._checked, self._drift = self.Toolkit.clock(), False
+        return True
+
+
+class Oracle(object):
+    """
+    https://en.wikipedia.org/wiki/Mark-to-market_accounting
+
+    The prices of every market at once (a single, all markets request), kept for 'ttl' seconds,
+    to value whole balances in BTC and USD without downloading a book for each currency.
+    """
+
+    def __init__(self, wrapper, ttl=30):
+        """
+        Constructor method.
+        """
+
+        self.Wrapper = wrapper
+        self.Brand = self.Wrapper.Brand
+        self.TTL = ttl
+
+        self.Toolkit = self.Wrapper.Toolkit
+        self.log = self.Toolkit.log
+        self._prices = None
+
+    def prices(self):
+        """
+        {symbol: (lowest ask, highest bid)} for every market of the site.
+        """
+
+        try:
+            if self._prices is None or self.Toolkit.clock() - self._prices[0] > self.TTL:
+                summaries = self.Wrapper.summaries(btc_only=False)
+                assert summaries is not None
+                self._prices = self.Toolkit.clock(), {s: (l_ask, h_bid) for s, (l_ask, h_bid, _, _) in summaries.items()}
+            return self._prices[1]
+
+        except AssertionError:
+            return
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def value(self, balance):
+        """
+        {currency: [BTC value, USD value]} for a whole 'balance' (as given by 'Wrapper.balance()'),
+        at the price anyone would pay right now.
+        """
+
+        try:
+            prices = self.prices()
+            assert prices is not None
+            assert ('btc', 'usdt') in prices
+            nakamoto = prices[('btc', 'usdt')]
+
+            holdings = {}
+            for currency, (available, on_orders) in balance.items():
+                subtotal = available + on_orders
+
+                if currency == 'btc':
+                    btctotal = subtotal
+                elif currency == 'usdt':
+                    btctotal = subtotal / nakamoto[0]
+                elif (currency, 'btc') in prices:
+                    btctotal = subtotal * prices[(currency, 'btc')][1]
+                elif ('btc', currency) in prices:
+                    btctotal = subtotal / prices[('btc', currency)][0]
+                elif (currency, 'usdt') in prices:
+                    btctotal = subtotal * prices[(currency, 'usdt')][1] / nakamoto[0]
+                else:
+                    self.log('No price found for {}: valued as zero.'.format(currency), self)
+                    btctotal = 0.
+
+                holdings[currency] = [btctotal, [btctotal * nakamoto[1], subtotal][currency == 'usdt']]
+            return holdings
+
+        except AssertionError:
+            return
+        except:
+            self.log(traceback.format_exc(), self)
@@ -0,0 +1,174 @@
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+
+from collections import Counter
+from os.path import exists
+
+
+class Profiler(object):
+    """
+    https://en.wikipedia.org/wiki/Profiling_(computer_programming)#Statistical_profilers
+
+    On demand, just like the HALT file: once '/logs/.profile.<brand>' appears (see 'bin/profile.sh'), the stacks
+    of every thread of this process are sampled every 'rate' seconds and its memory allocations traced, for as
+    many seconds as written in that file (or 'seconds'). Then '/logs/profile.<brand>.<time>.*' get the results:
+    '.pstats' (for 'python -m pstats', snakeviz...), '.cpu.txt', '.mem.txt' and '.folded' (for flame graphs).
+
+    Only code objects and line numbers are read from the frames, never their local variables.
+    """
+
+    def __init__(self, toolkit, brand, seconds=30., rate=.01, interval=1., top=40):
+        """
+        Constructor method.
+        """
+
+        self.Toolkit = toolkit
+        self.Brand = brand
+        self.Path = self.Toolkit.Path + '/logs/'
+        self.Trigger = self.Path + '.profile.' + brand
+        self.Seconds, self.Rate, self.Interval, self.Top = seconds, rate, interval, top
+        self.log = self.Toolkit.log
+
+        self._pid, self._thread = None, None
+
+    def start(self):
+        """
+        Starts watching for the trigger file (once per process: a forked one needs its own watcher).
+        """
+
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return self
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def profile(self, seconds=None):
+        """
+        Samples (and traces) right now, for 'seconds', then writes the reports: returns their common prefix.
+        """
+
+        seconds = self.Seconds if seconds is None else seconds
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start(10)
+
+        self.log('Profiling for {:.0f} seconds...'.format(seconds), self)
+        samples, stacks, started = 0, Counter(), time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline and not self.Toolkit.Stop.wait(self.Rate):
+            stacks.update(self._sample())
+            samples += 1
+        elapsed = time.perf_counter() - started
+
+        snapshot = tracemalloc.take_snapshot()
+        if not tracing:
+            tracemalloc.stop()
+
+        prefix = self.Path + 'profile.{0}.{1}'.format(self.Brand, time.strftime('%Y%m%d%H%M%S', time.gmtime()))
+        self._cpu(prefix, stacks, elapsed / max(1, samples), samples)
+        self._memory(prefix, snapshot)
+        self.log('...{0} samples taken in {1:.2f} seconds, see {2}.*'.format(samples, elapsed, prefix), self)
+        return prefix
+
+    def _run(self):
+        """
+        """
+
+        while not self.Toolkit.Stop.wait(self.Interval):
+            try:
+                if exists(self.Trigger):
+                    with open(self.Trigger) as fp:
+                        text = fp.read().strip()
+                    os.remove(self.Trigger)
+                    self.profile(float(text) if len(text) > 0 else None)
+            except:
+                self.log(traceback.format_exc(), self)
+
+    def _sample(self):
+        """
+        One stack (a tuple of (filename, first line, function name), the outermost call first) for each
+        thread but this one, under its thread's name.
+        """
+
+        names = {t.ident: t.name for t in threading.enumerate()}
+        tmp = []
+        for ident, frame in sys._current_frames().items():
+            if ident == threading.get_ident():
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            tmp.append((names.get(ident, str(ident)),) + tuple(reversed(stack)))
+        return tmp
+
+    def _cpu(self, prefix, stacks, period, samples):
+        """
+        The samples, as 'pstats' would have them (calls are samples, times are samples * 'period'), plus the
+        text report and the folded stacks.
+        """
+
+        own, cumulative, callers = Counter(), Counter(), {}
+        for (_, *stack), count in stacks.items():
+            if len(stack) == 0:
+                continue
+            own[stack[-1]] += count
+            for func in set(stack):
+                cumulative[func] += count
+            for caller, callee in set(zip(stack, stack[1:])):
+                callers.setdefault(callee, Counter())[caller] += count
+
+        stats = {func: (n, n, own[func] * period, n * period,
+                        {c: (k, k, 0., k * period) for c, k in callers.get(func, {}).items()})
+                 for func, n in cumulative.items()}
+
+        os.makedirs(self.Path, exist_ok=True)
+        with open(prefix + '.pstats', 'wb') as fp:
+            marshal.dump(stats, fp)
+
+        stream = io.StringIO()
+        stream.write('{0} samples every {1:.4f} seconds (calls are samples, times are estimates).\n'.format(
+            samples, period))
+        if len(stats) > 0:
+            tmp = pstats.Stats(prefix + '.pstats', stream=stream)
+            tmp.sort_stats('cumulative').print_stats(self.Top)
+            tmp.sort_stats('tottime').print_stats(self.Top)
+        with open(prefix + '.cpu.txt', 'w') as fp:
+            fp.write(stream.getvalue())
+
+        with open(prefix + '.folded', 'w') as fp:
+            for (thread, *stack), count in stacks.most_common():
+                fp.write(';'.join([thread] + ['{2} ({0}:{1})'.format(*f) for f in stack]) + ' {}\n'.format(count))
+
+    def _memory(self, prefix, snapshot):
+        """
+        The biggest allocations made while profiling (and still alive at its end), by line and by traceback.
+        """
+
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                           tracemalloc.Filter(False, __file__),
+                                           tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')])
+        lines = snapshot.statistics('lineno')
+        total = sum(s.size for s in lines)
+
+        with open(prefix + '.mem.txt', 'w') as fp:
+            fp.write('{0} blocks, {1:.1f} KiB allocated while profiling (and still alive).\n\n'.format(
+                sum(s.count for s in lines), total / 1024))
+            fp.write('Top {} lines:\n'.format(self.Top))
+            for s in lines[:self.Top]:
+                fp.write('{0}\n'.format(s))
+
+            fp.write('\nTop 10 tracebacks:\n')
+            for s in snapshot.statistics('traceback')[:10]:
+                fp.write('\n{0} blocks, {1:.1f} KiB\n'.format(s.count, s.size / 1024))
+                fp.write('\n'.join(s.traceback.format()) + '\n')
@@ -0,0 +1,184 @@
+import mmap
+import os
+import threading
+import traceback
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+
+class Store(object):
+    """
+    https://en.wikipedia.org/wiki/Time_series_database
+
+    All the trades ever seen by an exchange, one 'Series' per symbol, at '/data/<brand>/'.
+    """
+
+    def __init__(self, wrapper):
+        """
+        Constructor method.
+        """
+
+        self.Wrapper = wrapper
+        self.Brand = self.Wrapper.Brand
+
+        self.Toolkit = self.Wrapper.Toolkit
+        self.Path = self.Toolkit.Data + self.Brand + '/'
+        self.log = self.Toolkit.log
+
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def series(self, symbol):
+        """
+        """
+
+        with self._lock:
+            if symbol not in self._series:
+                self._series[symbol] = Series(self.Path + '_'.join(symbol))
+            return self._series[symbol]
+
+    def append(self, symbol, history):
+        """
+        Saves the (epoch, signed_qty, price) trades not saved yet, and returns how many of them were new.
+        """
+
+        try:
+            return self.series(symbol).append(history)
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def history(self, symbol, since=None, until=None):
+        """
+        The (epoch, signed_qty, price) trades from 'since' up to 'until' (both epochs, inclusive).
+        """
+
+        try:
+            return self.series(symbol).range(since, until)
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def frequency(self, symbol, hours=1.):
+        """
+        Trades per hour along the last 'hours', without downloading anything.
+        """
+
+        try:
+            now = int(self.Toolkit.clock())
+            return self.series(symbol).count(now - int(3600 * hours), now) / hours
+        except:
+            self.log(traceback.format_exc(), self)
+
+
+class Series(object):
+    """
+    Append-only columns (epochs as int64, signed quantities and prices as float64), one file each,
+    memory-mapped for reading: a time range is just a binary search over the epochs.
+    """
+
+    Columns = [('time', 'q'), ('qty', 'd'), ('price', 'd')]
+
+    def __init__(self, prefix):
+        """
+        Constructor method.
+        """
+
+        self.Prefix = prefix
+        self._lock = threading.Lock()
+        self._maps, self._views, self._length = {}, {}, -1
+
+    def append(self, history):
+        """
+        """
+
+        with self._lock:
+            self._remap()
+            length = self._length
+
+            tmp = sorted(history)
+            if length > 0:
+                last = self._views['time'][length - 1]
+                i = bisect_left(self._views['time'], last, 0, length)
+                seen = Counter(zip(self._views['time'][i:length], self._views['qty'][i:length],
+                                   self._views['price'][i:length]))
+                fresh = []
+                for trade in tmp:
+                    if trade[0] > last:
+                        fresh.append(trade)
+                    elif trade[0] == last and seen[trade] > 0:
+                        seen[trade] -= 1
+                    elif trade[0] == last:
+                        fresh.append(trade)
+                tmp = fresh
+
+            if len(tmp) > 0:
+                os.makedirs(os.path.dirname(self.Prefix), exist_ok=True)
+                for (column, code), values in zip(self.Columns, zip(*tmp)):
+                    with open(self._file(column), 'ab') as fp:
+                        fp.truncate(self._length * array(code).itemsize)  # drops any half written tail
+                        fp.seek(0, os.SEEK_END)
+                        fp.write(array(code, values).tobytes())
+                self._length = -1  # remap on the next read
+            return len(tmp)
+
+    def range(self, since=None, until=None):
+        """
+        """
+
+        with self._lock:
+            self._remap()
+            i, j = self._bounds(since, until)
+            return list(zip(self._views['time'][i:j], self._views['qty'][i:j], self._views['price'][i:j]))
+
+    def count(self, since=None, until=None):
+        """
+        """
+
+        with self._lock:
+            self._remap()
+            i, j = self._bounds(since, until)
+            return j - i
+
+    def _bounds(self, since, until):
+        """
+        """
+
+        if self._length <= 0:
+            return 0, 0
+
+        epochs = self._views['time']
+        i = 0 if since is None else bisect_left(epochs, since, 0, self._length)
+        j = self._length if until is None else bisect_right(epochs, until, 0, self._length)
+        return i, j
+
+    def _remap(self):
+        """
+        (Re)maps the files whenever they have grown: the length is the one of the shortest column,
+        just in case a previous append was interrupted.
+        """
+
+        sizes = {c: os.path.getsize(self._file(c)) // array(code).itemsize if os.path.exists(self._file(c)) else 0
+                 for c, code in self.Columns}
+        length = min(sizes.values())
+        if length == self._length:
+            return
+
+        for view in self._views.values():
+            view.release()
+        for m in self._maps.values():
+            m.close()
+        self._maps, self._views, self._length = {}, {}, length
+
+        if length > 0:
+            for column, code in self.Columns:
+                with open(self._file(column), 'rb') as fp:
+                    self._maps[column] = mmap.mmap(fp.fileno(), length * array(code).itemsize,
+                                                   access=mmap.ACCESS_READ)
+                self._views[column] = memoryview(self._maps[column]).cast(code)
+
+    def _file(self, column):
+        """
+        """
+
+        return self.Prefix + '.' + column
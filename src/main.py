@@ -1,19 +1,32 @@
+import asyncio
 import sys
 import time
 import traceback
 
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Process
 from .functions import *
 from .plugins import *          # Appears as unused in PyCharm, but simply ignore that.
 from .plugins.sandbox import *  # Appears as unused in PyCharm, but simply ignore that.
 
 
+def profile(brand):
+    """
+    Profiling on demand (see 'prof.Profiler' and 'bin/profile.sh').
+    """
+
+    return prof.Profiler(tlk, brand, float(tlk.setup().get('profile_seconds', 30)),
+                         float(tlk.setup().get('profile_rate', .01))).start()
+
+
 def operation(wrapper, olap_only=True):
     """
     A process for each market.
     """
 
     try:
+        tlk.Metrics.Name = wrapper.Brand
+        profile(wrapper.Brand)
         tlk.log(spacer, wrapper)
         tlk.log(tlk.Greeting, wrapper)
 
@@ -39,11 +52,66 @@ def operation(wrapper, olap_only=True):
         tlk.log('', wrapper)
     except:
         tlk.log(traceback.format_exc(), wrapper)
+    tlk.flush()
+
+
+async def coroutine(wrapper, executor):
+    """
+    Same as 'operation()' (analysis only), but as a coroutine: all the markets share the same process / event loop.
+    """
+
+    try:
+        profile(wrapper.Brand)  # the whole process (every market) is sampled, anyway.
+        tlk.log(spacer, wrapper)
+        tlk.log(tlk.Greeting, wrapper)
+
+        asynchronous = netw.Asynchronous(wrapper, executor, asyncio.get_running_loop())
+        auditor = ctrl.Auditor(wrapper)
+        database = dbms.Database(wrapper)
+        advisor = olap.Advisor(database)
+        advisor.Asynchronous = asynchronous  # its scans are gathered right here, on this event loop.
+
+        if tlk.setup()['live_mode'].lower() == 'yes':
+            while not tlk.halt():
+                await asynchronous.run(advisor.broadway)
+                await tlk.snooze()
+        else:
+            await asynchronous.run(auditor.test)
+
+        tlk.log(spacer, wrapper)
+        tlk.log('', wrapper)
+    except asyncio.CancelledError:
+        tlk.log('(Cancelled while shutting down.)', wrapper)
+    except:
+        tlk.log(traceback.format_exc(), wrapper)
+
+
+async def gathering(plugins, timeout=3):
+    """
+    Starts a new coroutine for each enabled (authorized) plugin, all of them in this same event loop.
+    """
+
+    workers = int(tlk.setup().get('async_workers', 4 * len(plugins)))
+    executor = ThreadPoolExecutor(max_workers=max(len(plugins) + 1, workers))  # 'broadway()' takes one each.
+    try:
+        bots = {asyncio.ensure_future(coroutine(plg, executor)) for plg in plugins}
+
+        while not tlk.halt():
+            await asyncio.sleep(.1)
+
+        _, pending = await asyncio.wait(bots, timeout=2 * timeout)
+        for b in pending:
+            b.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        # Off the loop: a 'broadway()' still running in the executor may be waiting for a scan on this very loop.
+        await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
 
 
 def control(timeout=3):
     """
-    Start a new process for each enabled (authorized) plugin.
+    Start a new process for each enabled (authorized) plugin
+    (or a new coroutine, if the 'asyncio' runtime is chosen at '/bin/conf.ini').
     """
 
     try:
@@ -51,27 +119,35 @@ def control(timeout=3):
         tlk.log(tlk.Greeting)
 
         authorized = tlk.setup()['authorized'].split()
-        bots = {Process(target=operation, args=(plg,))
-                for plg in tlk.Plugins if plg.Brand in authorized}
+        plugins = {plg for plg in tlk.Plugins if plg.Brand in authorized}
+        tlk.Bus = ipcs.Bus(tlk, {plg.Brand for plg in plugins})
+        tlk.watch()
+
+        if tlk.setup().get('runtime', 'process').lower() == 'asyncio':
+            asyncio.run(gathering(plugins, timeout))
+        else:
+            bots = {Process(target=operation, args=(plg,)) for plg in plugins}
 
-        for b in bots:
-            b.start()
+            for b in bots:
+                b.start()
 
-        while not tlk.halt():
-            time.sleep(.1)
+            while not tlk.halt():
+                tlk.sleep(1.)
 
-        for b in bots:
-            b.join(timeout)
-        time.sleep(timeout)
+            for b in bots:
+                b.join(timeout)
+            time.sleep(timeout)
 
-        for b in bots:
-            b.terminate()
+            for b in bots:
+                b.terminate()
+        tlk.Bus.close(unlink=True)
         tlk.halt(remove=True)
 
         tlk.log('SHUTTING DOWN OPERATIONS... BYE!')
         tlk.log('')
     except:
         tlk.log(traceback.format_exc())
+    tlk.flush()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,853 @@
+import json
+import math
+import random
+import sys
+import threading
+import time
+import traceback
+
+from bisect import bisect_left, insort
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+
+from .functions import *
+from .plugins import *  # Appears as unused in PyCharm, but simply ignore that.
+
+
+class Book(object):
+    """
+    https://en.wikipedia.org/wiki/Order_matching_system
+
+    A limit order book with price-time priority: one FIFO queue of orders per price level.
+    """
+
+    def __init__(self):
+        """
+        Constructor method.
+        """
+
+        self.Levels = {1: {}, -1: {}}  # side (1: bids, -1: asks) -> {price: deque of orders}
+        self.Prices = {1: [], -1: []}  # ascending, for each side
+
+    def best(self, side):
+        """
+        Best price of a side (the highest bid or the lowest ask), or None if it's empty.
+        """
+
+        prices = self.Prices[side]
+        if len(prices) > 0:
+            return prices[-1] if side == 1 else prices[0]
+
+    def add(self, order):
+        """
+        """
+
+        side, price = order['side'], order['price']
+        if price not in self.Levels[side]:
+            self.Levels[side][price] = deque()
+            insort(self.Prices[side], price)
+        self.Levels[side][price].append(order)
+
+    def remove(self, order):
+        """
+        """
+
+        side, price = order['side'], order['price']
+        level = self.Levels[side].get(price)
+        if level is not None and order in level:
+            level.remove(order)
+            if len(level) == 0:
+                self._drop(side, price)
+
+    def match(self, order):
+        """
+        Takes liquidity from the other side for as long as it crosses 'order': yields (resting order, price, amount),
+        the oldest resting orders (at the best prices) first.
+        """
+
+        side = -order['side']
+        while order['qty'] - order['executed'] > 1E-12:
+            price = self.best(side)
+            if price is None or (price - order['price']) * order['side'] > 0:
+                return
+
+            level = self.Levels[side][price]
+            resting = level[0]
+            amount = min(order['qty'] - order['executed'], resting['qty'] - resting['executed'])
+            yield resting, price, amount
+
+            if resting['qty'] - resting['executed'] <= 1E-12:
+                level.popleft()
+                if len(level) == 0:
+                    self._drop(side, price)
+
+    def depth(self, side, limit=100):
+        """
+        [(price, amount)] of a side, the best prices first.
+        """
+
+        prices = self.Prices[side][-limit:][::-1] if side == 1 else self.Prices[side][:limit]
+        return [(p, sum(o['qty'] - o['executed'] for o in self.Levels[side][p])) for p in prices]
+
+    def _drop(self, side, price):
+        """
+        """
+
+        del self.Levels[side][price]
+        prices = self.Prices[side]
+        del prices[bisect_left(prices, price)]
+
+
+class Market(object):
+    """
+    Every symbol of a (fake) exchange, and a single account (the one trading on it), whose orders
+    are matched just like anyone else's. Synthetic traders (with endless funds) keep the books and
+    the trades going, see 'flow()'.
+    """
+
+    def __init__(self, brand, fee=.1, symbols=50, funds=1., seed=0, warmup=20):
+        """
+        Constructor method.
+        """
+
+        self.Brand, self.Fee = brand, fee
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+        self.Books, self.Trades, self.Mids, self.Stats = {}, {}, {}, {}
+        self.Orders, self.Balance = {}, {'btc': [funds, 0.]}
+        self._sequence, self._trade_id = 1000, 0
+
+        names = ['c{:03d}'.format(i) for i in range(symbols)]
+        for s in [(n, 'btc') for n in names] + [('btc', 'usdt'), (names[0], 'eth')]:
+            self.Books[s], self.Trades[s] = Book(), deque(maxlen=1000)
+            self.Mids[s] = 60000. if s == ('btc', 'usdt') else 10 ** self._random.uniform(-5, -2)
+            self.Stats[s] = {'open': self.Mids[s], 'high': self.Mids[s], 'low': self.Mids[s], 'volume': 0.,
+                             'count': 0, 'since': time.time()}
+            for _ in range(50):
+                self._synthetic(s, maker=True)
+        for _ in range(warmup):  # some trades already, so the markets look alive from the start.
+            self.flow()
+
+    def place(self, symbol, amount, price):
+        """
+        A new order of the account (a positive 'amount' buys, a negative one sells): its id, or None if
+        there are not enough funds for it.
+        """
+
+        with self._lock:
+            base, quote = symbol
+            currency, value = [(base, -amount), (quote, amount * price)][amount > 0]
+            funds = self.Balance.setdefault(currency, [0., 0.])
+            if not 0 < value <= funds[0] + 1E-12:
+                return
+
+            funds[0] -= value
+            funds[1] += value
+            order = self._order(symbol, amount, price, 'account')
+            self._execute(order)
+            return order['id']
+
+    def cancel(self, order_id):
+        """
+        True if it was open (and now it's cancelled).
+        """
+
+        with self._lock:
+            order = self.Orders.get(order_id)
+            if order is None or order['state'] != 'open':
+                return False
+
+            self.Books[order['symbol']].remove(order)
+            order['state'] = 'cancelled'
+            self._release(order)
+            return True
+
+    def order(self, order_id):
+        """
+        """
+
+        with self._lock:
+            tmp = self.Orders.get(order_id)
+            return None if tmp is None else dict(tmp)
+
+    def open_orders(self):
+        """
+        """
+
+        with self._lock:
+            return [dict(o) for o in self.Orders.values() if o['state'] == 'open']
+
+    def balance(self):
+        """
+        {currency: (available, on_orders)}
+        """
+
+        with self._lock:
+            return {c: tuple(v) for c, v in self.Balance.items()}
+
+    def trades(self, symbol, since_id=None, limit=100):
+        """
+        The latest 'limit' trades (or the first 'limit' ones from 'since_id' on), oldest first.
+        """
+
+        with self._lock:
+            tmp = list(self.Trades[symbol])
+        if since_id is not None:
+            return [t for t in tmp if t['id'] >= since_id][:limit]
+        return tmp[-limit:]
+
+    def depth(self, symbol, limit=100):
+        """
+        (asks, bids): [(price, amount)] each, the best prices first.
+        """
+
+        with self._lock:
+            book = self.Books[symbol]
+            return book.depth(-1, limit), book.depth(1, limit)
+
+    def ticker(self, symbol):
+        """
+        The 24h 'count' (of trades) and 'volume' (in quote currency) are extrapolated from their rates since
+        the market opened (at least a minute ago, as far as this is concerned).
+        """
+
+        with self._lock:
+            book, stats = self.Books[symbol], self.Stats[symbol]
+            l_ask, h_bid = book.best(-1), book.best(1)
+            last = self.Trades[symbol][-1]['price'] if len(self.Trades[symbol]) > 0 else self.Mids[symbol]
+            days = max(60., time.time() - stats['since']) / 86400
+            return {'ask': l_ask or last, 'bid': h_bid or last, 'last': last, 'count': int(stats['count'] / days),
+                    'open': stats['open'], 'high': stats['high'], 'low': stats['low'],
+                    'volume': stats['volume'] / days}
+
+    def flow(self, orders=5, volatility=.002):
+        """
+        One step of synthetic order flow: mid prices move at random, new orders rest around them (or cross
+        the spread, making trades) and the farthest synthetic orders go away so the books don't grow forever.
+        """
+
+        with self._lock:
+            for s in self.Books:
+                self.Mids[s] *= math.exp(self._random.gauss(0, volatility))
+                for _ in range(self._random.randint(1, orders)):
+                    self._synthetic(s, maker=self._random.random() < .7)
+                self._trim(s)
+
+    def _synthetic(self, symbol, maker=True):
+        """
+        """
+
+        mid, side = self.Mids[symbol], self._random.choice([1, -1])
+        if maker:  # buying under the mid price (or selling over it), it rests in the book...
+            price = mid * (1 - side * self._random.uniform(1E-4, .03))
+        else:  # ...while over it (or under it), it crosses the spread.
+            price = mid * (1 + side * self._random.uniform(1E-3, .01))
+        price = max(1E-8, round(price, 8))  # the usual tick size
+        amount = side * self._random.uniform(.1, 10) * .05 / mid  # about .25 BTC (quote currency) on average
+        self._execute(self._order(symbol, amount, price, None))
+
+    def _order(self, symbol, amount, price, owner):
+        """
+        """
+
+        self._sequence += 1
+        order = {'id': self._sequence, 'symbol': symbol, 'side': [-1, 1][amount > 0], 'price': price,
+                 'qty': abs(amount), 'executed': 0., 'owner': owner, 'time': time.time(), 'state': 'open',
+                 'trades': []}
+        self.Orders[order['id']] = order
+        return order
+
+    def _execute(self, order):
+        """
+        Matches a new order (it pays the fee as the taker, but at the resting orders' prices) and rests what's left.
+        """
+
+        symbol, book = order['symbol'], self.Books[order['symbol']]
+        for resting, price, amount in book.match(order):
+            self._trade_id += 1
+            trade = {'id': self._trade_id, 'time': time.time(), 'price': price, 'qty': amount,
+                     'buyer_maker': resting['side'] == 1}
+            self.Trades[symbol].append(trade)
+
+            stats = self.Stats[symbol]
+            stats['high'], stats['low'] = max(stats['high'], price), min(stats['low'], price)
+            stats['volume'] += amount * price
+            stats['count'] += 1
+
+            for o in [resting, order]:
+                o['executed'] += amount
+                o['trades'].append((trade['id'], price, amount))
+                self._settle(o, price, amount)
+                if o['qty'] - o['executed'] <= 1E-12:
+                    o['state'] = 'filled'
+
+        if order['state'] == 'open':
+            book.add(order)
+
+    def _settle(self, order, price, amount):
+        """
+        """
+
+        if order['owner'] is None:
+            if order['qty'] - order['executed'] <= 1E-12:
+                self.Orders.pop(order['id'], None)  # nobody will ever ask about it.
+            return
+
+        base, quote = order['symbol']
+        fee = 1 - self.Fee / 100
+        for c in [base, quote]:
+            self.Balance.setdefault(c, [0., 0.])
+        if order['side'] == 1:
+            self.Balance[quote][1] -= amount * order['price']
+            self.Balance[quote][0] += amount * (order['price'] - price)  # price improvement
+            self.Balance[base][0] += fee * amount
+        else:
+            self.Balance[base][1] -= amount
+            self.Balance[quote][0] += fee * amount * price
+
+    def _release(self, order):
+        """
+        """
+
+        if order['owner'] is None:
+            return
+
+        base, quote = order['symbol']
+        remaining = order['qty'] - order['executed']
+        currency, value = [(base, remaining), (quote, remaining * order['price'])][order['side'] == 1]
+        self.Balance[currency][0] += value
+        self.Balance[currency][1] -= value
+
+    def _trim(self, symbol, levels=100):
+        """
+        """
+
+        book = self.Books[symbol]
+        for side in [1, -1]:
+            while len(book.Prices[side]) > levels:
+                price = book.Prices[side][0] if side == 1 else book.Prices[side][-1]
+                for order in list(book.Levels[side][price]):
+                    if order['owner'] is None:
+                        book.remove(order)
+                        self.Orders.pop(order['id'], None)
+                if price in book.Levels[side]:
+                    break  # someone's real order is there: keep it.
+
+
+class Faults(object):
+    """
+    What can go wrong with a real site: latency, random errors and, above all, rate limits.
+    More than 'limit' requests in 'period' seconds get an HTTP 429 (too many requests); insisting on that
+    ('ban_after' of them in a row) gets an HTTP 418 (banned) for 'ban' seconds, just like Binance does.
+    """
+
+    def __init__(self, latency=(0., 0.), error_rate=0., throttle_rate=0., limit=100, period=1., ban_after=10,
+                 ban=60., seed=0):
+        """
+        Constructor method.
+        """
+
+        self.Latency, self.ErrorRate, self.ThrottleRate = latency, error_rate, throttle_rate
+        self.Limit, self.Period, self.BanAfter, self.Ban = limit, period, ban_after, ban
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._requests, self._throttled, self._banned = {}, {}, {}
+
+    def check(self, brand):
+        """
+        Waits for the latency, then returns None (go ahead) or the (HTTP status, retry after) to respond with;
+        and how many requests were seen along the last minute (for the "used weight" headers).
+        """
+
+        with self._lock:
+            now = time.time()
+            latency = self._random.uniform(*self.Latency)
+            recent = self._requests.setdefault(brand, deque())
+            recent.append(now)
+            while now - recent[0] > max(60., self.Period):
+                recent.popleft()
+            used = len(recent)
+
+            fault = None
+            if now < self._banned.get(brand, 0.):
+                fault = 418, self._banned[brand] - now
+            elif sum(1 for t in recent if now - t <= self.Period) > self.Limit or \
+                    self._random.random() < self.ThrottleRate:
+                self._throttled[brand] = self._throttled.get(brand, 0) + 1
+                fault = 429, self.Period
+                if self._throttled[brand] >= self.BanAfter:
+                    self._banned[brand] = now + self.Ban
+                    fault = 418, self.Ban
+            else:
+                self._throttled[brand] = 0
+                if self._random.random() < self.ErrorRate:
+                    fault = 500, None
+
+        time.sleep(latency)
+        return fault, used
+
+
+class Server(object):
+    """
+    https://docs.python.org/3/library/http.server.html
+
+    A local (fake) exchange for each plugin, all of them at the same port: '/binance/', '/bittrex/api/v1.1/'
+    and '/poloniex/' serve the REST endpoints used by the plugins, so their 'base_uri' (see '/bin/conf.ini')
+    can point here. Nothing is signed or checked, every key works.
+    """
+
+    Fees = {'binance': .1, 'bittrex': .25, 'poloniex': .2}
+    Prefixes = {'binance': '/binance/', 'bittrex': '/bittrex/api/v1.1/', 'poloniex': '/poloniex/'}
+
+    def __init__(self, toolkit, host='127.0.0.1', port=8080, faults=None, symbols=50, funds=1., flow=1.):
+        """
+        Constructor method.
+        """
+
+        self.Toolkit = toolkit
+        self.log = self.Toolkit.log
+        self.Faults = faults or Faults()
+        self.Flow = flow
+        self.Markets = {b: Market(b, f, symbols, funds, seed=i) for i, (b, f) in enumerate(sorted(self.Fees.items()))}
+        self.Requests = dict.fromkeys(self.Markets, 0)
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server._handle(self)
+
+            def do_POST(self):
+                server._handle(self)
+
+            def do_PUT(self):
+                server._handle(self)
+
+            def do_DELETE(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.HTTPD = ThreadingHTTPServer((host, port), Handler)
+        self.HTTPD.daemon_threads = True
+        self.Address = self.HTTPD.server_address
+        self._threads = []
+
+    def uri(self, brand):
+        """
+        The 'base_uri' for a plugin.
+        """
+
+        return 'http://{0}:{1}'.format(*self.Address) + self.Prefixes[brand]
+
+    def start(self):
+        """
+        """
+
+        self._threads = [threading.Thread(target=self.HTTPD.serve_forever, daemon=True),
+                         threading.Thread(target=self._flow, daemon=True)]
+        for t in self._threads:
+            t.start()
+        self.log('Mock exchanges listening at http://{0}:{1}/'.format(*self.Address))
+        return self
+
+    def stop(self):
+        """
+        """
+
+        self.HTTPD.shutdown()
+        self.HTTPD.server_close()
+
+    def _flow(self):
+        """
+        """
+
+        while not self.Toolkit.halt():
+            for market in self.Markets.values():
+                market.flow()
+            self.Toolkit.sleep(self.Flow)
+
+    def _handle(self, request):
+        """
+        """
+
+        status, body, headers = 200, None, {}
+        try:
+            parts = parse.urlsplit(request.path)
+            params = dict(parse.parse_qsl(parts.query))
+            length = int(request.headers.get('Content-Length') or 0)
+            if length > 0:
+                params.update(parse.parse_qsl(request.rfile.read(length).decode()))
+
+            brand = [b for b, p in self.Prefixes.items() if parts.path.startswith(p)]
+            if len(brand) == 0:
+                status, body = 404, {'error': 'Not found.'}
+            else:
+                brand = brand[0]
+                path = parts.path[len(self.Prefixes[brand]):]
+
+                self.Requests[brand] += 1
+                fault, used = self.Faults.check(brand)
+                headers['X-MBX-USED-WEIGHT-1M'] = str(used)
+                if fault is not None:
+                    status, retry_after = fault
+                    body = {'code': -1003, 'msg': 'Mock fault.'}
+                    if retry_after is not None:
+                        headers['Retry-After'] = str(int(math.ceil(retry_after)))
+                else:
+                    market = self.Markets[brand]
+                    status, body = getattr(self, '_' + brand)(market, request.command, path, params)
+
+        except:
+            self.log(traceback.format_exc())
+            status, body = 500, {'error': 'Internal error.'}
+
+        data = json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        for k, v in headers.items():
+            request.send_header(k, v)
+        request.end_headers()
+        request.wfile.write(data)
+
+    @staticmethod
+    def _symbol(market, text, separator='', reverse=False):
+        """
+        The symbol (base, quote) of a site's market name, or None if it's unknown.
+        """
+
+        for s in market.Books:
+            if ((separator.join(s[::-1]) if reverse else separator.join(s)).upper()) == text.upper():
+                return s
+
+    def _binance(self, market, method, path, params):
+        """
+        https://github.com/binance-exchange/binance-official-api-docs/blob/master/rest-api.md
+        """
+
+        symbol = self._symbol(market, params.get('symbol', ''))
+        unknown = 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+
+        if path == 'api/v1/exchangeInfo':
+            return 200, {'symbols': [{
+                'symbol': ''.join(s).upper(), 'status': 'TRADING', 'baseAsset': s[0].upper(),
+                'quoteAsset': s[1].upper(), 'filters': [
+                    {'filterType': 'PRICE_FILTER', 'minPrice': '0.00000001', 'maxPrice': '100000.00000000'},
+                    {'filterType': 'LOT_SIZE', 'minQty': '0.00100000', 'maxQty': '10000000.00000000'},
+                    {'filterType': 'MIN_NOTIONAL', 'minNotional': '0.00010000'}]} for s in market.Books]}
+
+        elif path == 'api/v1/ticker/24hr':
+            def ticker(s):
+                t = market.ticker(s)
+                return {'symbol': ''.join(s).upper(), 'askPrice': '{:.8f}'.format(t['ask']),
+                        'bidPrice': '{:.8f}'.format(t['bid']), 'openPrice': '{:.8f}'.format(t['open']),
+                        'highPrice': '{:.8f}'.format(t['high']), 'lowPrice': '{:.8f}'.format(t['low']),
+                        'lastPrice': '{:.8f}'.format(t['last']), 'quoteVolume': '{:.8f}'.format(t['volume']),
+                        'count': t['count']}
+
+            if 'symbol' in params:
+                return (200, ticker(symbol)) if symbol is not None else unknown
+            return 200, [ticker(s) for s in market.Books]
+
+        elif path in ['api/v1/trades', 'api/v1/historicalTrades']:
+            if symbol is None:
+                return unknown
+            since = int(params['fromId']) if 'fromId' in params else None
+            return 200, [{'id': t['id'], 'price': '{:.8f}'.format(t['price']), 'qty': '{:.8f}'.format(t['qty']),
+                          'time': int(1E3 * t['time']), 'isBuyerMaker': t['buyer_maker']}
+                         for t in market.trades(symbol, since, int(params.get('limit', 500)))]
+
+        elif path == 'api/v1/depth':
+            if symbol is None:
+                return unknown
+            asks, bids = market.depth(symbol, int(params.get('limit', 100)))
+            return 200, {'lastUpdateId': market._trade_id,
+                         'asks': [['{:.8f}'.format(p), '{:.8f}'.format(a)] for p, a in asks],
+                         'bids': [['{:.8f}'.format(p), '{:.8f}'.format(a)] for p, a in bids]}
+
+        elif path == 'api/v3/account':
+            return 200, {'balances': [{'asset': c.upper(), 'free': '{:.8f}'.format(a), 'locked': '{:.8f}'.format(o)}
+                                      for c, (a, o) in market.balance().items()]}
+
+        elif path == 'api/v3/openOrders':
+            return 200, [self._binance_order(o) for o in market.open_orders()]
+
+        elif path == 'api/v3/order':
+            if method == 'POST':
+                if symbol is None:
+                    return unknown
+                amount = [-1, 1][params['side'] == 'BUY'] * float(params['quantity'])
+                oid = market.place(symbol, amount, float(params['price']))
+                if oid is None:
+                    return 400, {'code': -2010, 'msg': 'Account has insufficient balance for requested action.'}
+                return 200, {'symbol': params['symbol'], 'orderId': oid}
+
+            order = market.order(int(params.get('orderId', 0)))
+            if order is None or order['owner'] is None:
+                return 400, {'code': -2013, 'msg': 'Order does not exist.'}
+            if method == 'DELETE':
+                if not market.cancel(order['id']):
+                    return 400, {'code': -2011, 'msg': 'Unknown order sent.'}
+                order = market.order(order['id'])
+            return 200, self._binance_order(order)
+
+        elif path == 'api/v1/userDataStream':
+            return 200, {'listenKey': 'mock'} if method == 'POST' else {}
+
+        return 404, {'code': -1, 'msg': 'Not found.'}
+
+    @staticmethod
+    def _binance_order(order):
+        """
+        """
+
+        state = order['state']
+        if state == 'open':
+            status = ['NEW', 'PARTIALLY_FILLED'][order['executed'] > 0]
+        else:
+            status = {'filled': 'FILLED', 'cancelled': 'CANCELED'}[state]
+        return {'orderId': order['id'], 'symbol': ''.join(order['symbol']).upper(), 'status': status,
+                'side': ['SELL', 'BUY'][order['side'] == 1], 'price': '{:.8f}'.format(order['price']),
+                'origQty': '{:.8f}'.format(order['qty']), 'executedQty': '{:.8f}'.format(order['executed'])}
+
+    def _bittrex(self, market, method, path, params):
+        """
+        https://bittrex.com/Home/Api
+        """
+
+        def success(result):
+            return 200, {'success': True, 'message': '', 'result': result}
+
+        def failure(message):
+            return 200, {'success': False, 'message': message, 'result': None}
+
+        def name(s):
+            return '-'.join(s[::-1]).upper()
+
+        symbol = self._symbol(market, params.get('market', ''), '-', True)
+        if path.startswith('public/') and path not in ['public/getmarkets', 'public/getmarketsummaries'] \
+                and symbol is None:
+            return failure('INVALID_MARKET')
+
+        if path == 'public/getmarkets':
+            return success([{'MarketName': name(s), 'IsActive': True} for s in market.Books])
+
+        elif path == 'public/getmarketsummaries':
+            return success([{'MarketName': name(s), 'Ask': t['ask'], 'Bid': t['bid'], 'BaseVolume': t['volume']}
+                            for s, t in ((s, market.ticker(s)) for s in market.Books)])
+
+        elif path == 'public/getmarketsummary':
+            t = market.ticker(symbol)
+            return success([{'MarketName': name(symbol), 'PrevDay': t['open'], 'High': t['high'], 'Low': t['low'],
+                             'Last': t['last'], 'BaseVolume': t['volume']}])
+
+        elif path == 'public/getmarkethistory':
+            return success([{'Id': t['id'], 'Quantity': t['qty'], 'Price': t['price'],
+                             'OrderType': ['BUY', 'SELL'][t['buyer_maker']],
+                             'TimeStamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t['time'])) + '.000'}
+                            for t in reversed(market.trades(symbol, limit=100))])
+
+        elif path == 'public/getorderbook':
+            asks, bids = market.depth(symbol)
+            return success({'sell': [{'Rate': p, 'Quantity': a} for p, a in asks],
+                            'buy': [{'Rate': p, 'Quantity': a} for p, a in bids]})
+
+        elif path == 'account/getbalances':
+            return success([{'Currency': c.upper(), 'Balance': a + o, 'Available': a}
+                            for c, (a, o) in market.balance().items()])
+
+        elif path in ['market/buylimit', 'market/selllimit']:
+            if symbol is None:
+                return failure('INVALID_MARKET')
+            amount = [-1, 1][path == 'market/buylimit'] * float(params['quantity'])
+            oid = market.place(symbol, amount, float(params['rate']))
+            if oid is None:
+                return failure('INSUFFICIENT_FUNDS')
+            return success({'uuid': str(oid)})
+
+        elif path == 'market/getopenorders':
+            return success([{'OrderUuid': str(o['id']), 'Exchange': name(o['symbol']),
+                             'OrderType': ['LIMIT_SELL', 'LIMIT_BUY'][o['side'] == 1], 'Limit': o['price'],
+                             'Quantity': o['qty'], 'QuantityRemaining': o['qty'] - o['executed']}
+                            for o in market.open_orders()])
+
+        elif path in ['account/getorder', 'market/cancel']:
+            order = market.order(int(params['uuid'])) if params.get('uuid', '').isdigit() else None
+            if order is None or order['owner'] is None:
+                return failure('INVALID_ORDER')
+            if path == 'market/cancel':
+                return success(None) if market.cancel(order['id']) else failure('ORDER_NOT_OPEN')
+            return success({'OrderUuid': str(order['id']), 'Exchange': name(order['symbol']),
+                            'Quantity': order['qty'], 'QuantityRemaining': order['qty'] - order['executed'],
+                            'Limit': order['price'], 'IsOpen': order['state'] == 'open'})
+
+        return 404, {'success': False, 'message': 'NOT_FOUND', 'result': None}
+
+    def _poloniex(self, market, method, path, params):
+        """
+        https://poloniex.com/support/api/
+        """
+
+        def name(s):
+            return '_'.join(s[::-1]).upper()
+
+        command = params.get('command')
+        symbol = self._symbol(market, params.get('currencyPair', ''), '_', True)
+        if path == 'public' and command != 'returnTicker' and symbol is None:
+            return 200, {'error': 'Invalid currency pair.'}
+
+        if path == 'public' and command == 'returnTicker':
+            tmp = {}
+            for s in market.Books:
+                t = market.ticker(s)
+                tmp[name(s)] = {'lowestAsk': '{:.8f}'.format(t['ask']), 'highestBid': '{:.8f}'.format(t['bid']),
+                                'last': '{:.8f}'.format(t['last']), 'baseVolume': '{:.8f}'.format(t['volume']),
+                                'isFrozen': '0'}
+            return 200, tmp
+
+        elif path == 'public' and command == 'returnChartData':
+            t = market.ticker(symbol)
+            return 200, [{'date': int(params.get('end', time.time())), 'open': t['open'], 'high': t['high'],
+                          'low': t['low'], 'close': t['last'], 'volume': t['volume']}]
+
+        elif path == 'public' and command == 'returnTradeHistory':
+            tmp = market.trades(symbol, limit=1000)
+            if 'start' in params:
+                tmp = [t for t in tmp if int(params['start']) <= t['time'] <= int(params.get('end', time.time())) + 1]
+            return 200, [{'tradeID': t['id'], 'rate': '{:.8f}'.format(t['price']), 'amount': '{:.8f}'.format(t['qty']),
+                          'type': ['buy', 'sell'][t['buyer_maker']],
+                          'date': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(t['time']))}
+                         for t in reversed(tmp[-200:])]
+
+        elif path == 'public' and command == 'returnOrderBook':
+            asks, bids = market.depth(symbol, int(params.get('depth', 100)))
+            return 200, {'asks': [['{:.8f}'.format(p), a] for p, a in asks],
+                         'bids': [['{:.8f}'.format(p), a] for p, a in bids], 'isFrozen': '0'}
+
+        elif path == 'tradingApi' and command == 'returnCompleteBalances':
+            return 200, {c.upper(): {'available': '{:.8f}'.format(a), 'onOrders': '{:.8f}'.format(o)}
+                         for c, (a, o) in market.balance().items()}
+
+        elif path == 'tradingApi' and command in ['buy', 'sell']:
+            if symbol is None:
+                return 200, {'error': 'Invalid currency pair.'}
+            amount = [-1, 1][command == 'buy'] * float(params['amount'])
+            oid = market.place(symbol, amount, float(params['rate']))
+            if oid is None:
+                return 200, {'error': 'Not enough {}.'.format([symbol[0], symbol[1]][command == 'buy'].upper())}
+            return 200, {'orderNumber': str(oid), 'resultingTrades': []}
+
+        elif path == 'tradingApi' and command == 'returnOpenOrders':
+            tmp = {name(s): [] for s in market.Books}
+            for o in market.open_orders():
+                tmp[name(o['symbol'])].append({'orderNumber': str(o['id']), 'type': ['sell', 'buy'][o['side'] == 1],
+                                               'rate': '{:.8f}'.format(o['price']),
+                                               'amount': '{:.8f}'.format(o['qty'] - o['executed']),
+                                               'startingAmount': '{:.8f}'.format(o['qty'])})
+            return 200, tmp
+
+        elif path == 'tradingApi' and command in ['returnOrderStatus', 'returnOrderTrades', 'cancelOrder']:
+            order = market.order(int(params['orderNumber'])) if params.get('orderNumber', '').isdigit() else None
+            if order is None or order['owner'] is None:
+                return 200, {'error': 'Invalid order number, or you are not the person who placed the order.'}
+
+            if command == 'returnOrderStatus':
+                if order['state'] != 'open':
+                    return 200, {'success': 0, 'result': {'error': 'Order not found, or you are not the person '
+                                                                   'who placed it.'}}
+                return 200, {'success': 1, 'result': {str(order['id']): {
+                    'status': ['Open', 'Partially filled'][order['executed'] > 0],
+                    'amount': '{:.8f}'.format(order['qty'] - order['executed']),
+                    'startingAmount': '{:.8f}'.format(order['qty'])}}}
+            elif command == 'returnOrderTrades':
+                if len(order['trades']) == 0:
+                    return 200, {'error': 'Order not found, or you are not the person who placed it.'}
+                return 200, [{'tradeID': i, 'rate': '{:.8f}'.format(p), 'amount': '{:.8f}'.format(a)}
+                             for i, p, a in order['trades']]
+            if not market.cancel(order['id']):
+                return 200, {'error': 'Invalid order number, or you are not the person who placed the order.'}
+            return 200, {'success': 1}
+
+        return 404, {'error': 'Invalid command.'}
+
+
+def load(toolkit, server, brands, rounds=3, trips=10):
+    """
+    Points the plugins of 'brands' to the 'server' and measures the scan throughput (rounds of
+    'Advisor.broadway()', by the symbols actually scored in them) and the trading round trips
+    (fire, track until it's known, cancel).
+    """
+
+    report = {}
+    for wrapper in [plg for plg in toolkit.Plugins if plg.Brand in brands]:
+        try:
+            wrapper.BaseURI = server.uri(wrapper.Brand)
+            advisor = olap.Advisor(dbms.Database(wrapper))
+
+            scans, scored = [], []
+            for _ in range(rounds):
+                total, t_delta = toolkit.Metrics.total('symbols_scored_total', exchange=wrapper.Brand), time.time()
+                advisor.broadway()
+                scans.append(time.time() - t_delta)
+                scored.append(toolkit.Metrics.total('symbols_scored_total', exchange=wrapper.Brand) - total)
+
+            latencies = []
+            symbols = sorted(wrapper.symbols())
+            for i in range(trips):
+                symbol = symbols[i % len(symbols)]
+                book = wrapper.book(symbol)
+                if book is None or book.best() is None:
+                    continue
+                price = round(.9 * book.best()[1], 8)
+                amount = round(toolkit.Quota / price, 8)
+
+                t_delta = time.time()
+                fired = wrapper.fire(amount, price, symbol)
+                if fired is not None:
+                    wrapper.cancel(fired[0])
+                    latencies.append(time.time() - t_delta)
+
+            report[wrapper.Brand] = {
+                'requests': server.Requests[wrapper.Brand],
+                'scan_seconds': min(scans), 'symbols_scored': scored,  # (by each round, not prefiltered)
+                'symbols_per_second': sum(scored) / max(sum(scans), 1E-9),
+                'round_trips': len(latencies),
+                'round_trip_seconds': sorted(latencies)[len(latencies) // 2] if len(latencies) > 0 else None,
+            }
+            toolkit.log('LOAD TEST report: {}', wrapper, args=(report[wrapper.Brand],))
+        except:
+            toolkit.log(traceback.format_exc(), wrapper)
+    return report
+
+
+if __name__ == '__main__':
+    # python -m src.mock APPHOME            (serves until halted, see 'bin/stop.sh')
+    # python -m src.mock APPHOME load [brands...]
+    tlk = ctrl.Toolkit(sys.argv[1])
+
+    def setting(option, fallback):
+        return tlk.setup('mock', option, fallback)
+
+    faults = Faults(tuple(float(x) for x in setting('latency', '0 0').split()), float(setting('error_rate', 0)),
+                    float(setting('throttle_rate', 0)), int(setting('rate_limit', 100)),
+                    float(setting('rate_period', 1)), int(setting('ban_after', 10)), float(setting('ban', 60)))
+    mock = Server(tlk, setting('host', '127.0.0.1'), int(setting('port', 8080)), faults,
+                  int(setting('symbols', 50)), float(setting('funds', 1)), float(setting('flow', 1))).start()
+    tlk.watch()
+
+    if len(sys.argv) > 2 and sys.argv[2] == 'load':
+        print(json.dumps(load(tlk, mock, sys.argv[3:] or list(mock.Markets)), indent=2))
+        tlk.halt(send=True)
+    else:
+        while not tlk.halt():
+            tlk.sleep(1.)
+    mock.stop()
+    tlk.halt(remove=True)
+    tlk.flush()
@@ -1,11 +1,15 @@
 import hashlib
 import hmac
 import json
+import os
+import threading
 import time
 import traceback
 
 from decimal import Decimal
-from urllib import parse, request
+from urllib import error, parse
+
+from ..functions import ctrl, netw
 
 
 class Wrapper(object):
@@ -21,6 +25,9 @@ class Wrapper(object):
     https://github.com/binance-exchange/binance-official-api-docs
     """
 
+    States = {'NEW': 'open', 'PARTIALLY_FILLED': 'partial', 'FILLED': 'filled', 'CANCELED': 'cancelled',
+              'PENDING_CANCEL': 'cancelled', 'REJECTED': 'cancelled', 'EXPIRED': 'cancelled', }
+
     def __init__(self, toolkit):
         """
         Constructor method.
@@ -31,14 +38,32 @@ class Wrapper(object):
         self.Toolkit = toolkit
         self.Key, self.Secret = self.Toolkit.setup(self.Brand)
         self.log = self.Toolkit.log
-        self._filters, self._orders = {}, {}
+        self.BaseURI = self.Toolkit.setup(self.Brand, 'base_uri', 'https://api.binance.com/')
+        self._limiter = netw.Limiter(
+            float(self.Toolkit.setup(self.Brand, 'rate_limit', 1200)),
+            float(self.Toolkit.setup(self.Brand, 'rate_period', 60)))
+        self._filters, self._orders, self._trades = {}, {}, {}
+
+        self._depth = None
+        if self.Toolkit.setup(self.Brand, 'streaming', 'no').lower() == 'yes':
+            uri = self.Toolkit.setup(self.Brand, 'stream_uri', 'wss://stream.binance.com:9443/stream')
+            self._depth = Depth(self, uri, self.Toolkit.setup(self.Brand, 'stream_record') or None)
+        self._user = None
+        if self.Toolkit.setup(self.Brand, 'user_stream', 'no').lower() == 'yes':
+            uri = self.Toolkit.setup(self.Brand, 'stream_uri', 'wss://stream.binance.com:9443/stream')
+            self._user = UserData(self, uri)
+        self._weights = {
+            'depth': [(100, 1), (500, 5), (1000, 10), (5000, 50)],
+            'trades': [(1000, 1)],
+            'historicalTrades': [(1000, 5)],
+        }
 
     def symbols(self, btc_only=True):
         """
         """
 
         try:
-            req = self._request('api/v1/exchangeInfo', False)
+            req = self._request('api/v1/exchangeInfo', False, weight=10)
             assert req is not None
 
             for s_dict in req['symbols']:
@@ -73,19 +98,55 @@ class Wrapper(object):
         except:
             self.log(traceback.format_exc(), self)
 
+    def summaries(self, btc_only=True):
+        """
+        """
+
+        try:
+            if len(self._filters) == 0:
+                self.symbols()
+
+            translate = {''.join(s).upper(): s for s in self._filters}
+            req = self._request('api/v1/ticker/24hr', False, weight=40)
+            assert req is not None
+
+            tmp = {translate[d['symbol']]: (float(d['askPrice']), float(d['bidPrice']),
+                                            float(d['quoteVolume']), d['count'] / 24)
+                   for d in req if d['symbol'] in translate}
+
+            if btc_only:
+                return {s: v for s, v in tmp.items() if s[1] == 'btc'}
+            return tmp
+        except:
+            self.log(traceback.format_exc(), self)
+
     def history(self, symbol, limit=100):
         """
+        Only the trades newer than the last one seen for 'symbol' are downloaded (by trade id), unless
+        there are more than 'limit' of them: in that case the latest 'limit' are, just like the first time.
         """
 
         try:
-            req = self._request('api/v1/trades?symbol=' + ''.join(symbol).upper()
-                                + '&limit=100', False)
+            pair = ''.join(symbol).upper()
+            cursor, trades = self._trades.get(symbol, (None, []))
+
+            req = None
+            if cursor is not None:
+                req = self._request('api/v1/historicalTrades?symbol=' + pair + '&fromId={0}&limit={1}'.format(
+                    cursor + 1, limit), False, retry=0, weight=self._weight('historicalTrades', limit))
+                if req is not None and len(req) >= limit:
+                    req, trades = None, []
+            if req is None:
+                req = self._request('api/v1/trades?symbol=' + pair + '&limit={}'.format(limit),
+                                    False, weight=self._weight('trades', limit))
             assert req is not None
 
-            tmp = [(int(d['time'] / 1E3),
-                    [1, -1][d['isBuyerMaker']] * float(d['qty']),
-                    float(d['price'])) for d in req]
-            return tmp[-limit:]
+            trades = trades + [(d['id'], (int(d['time'] / 1E3),
+                                          [1, -1][d['isBuyerMaker']] * float(d['qty']),
+                                          float(d['price']))) for d in req if cursor is None or d['id'] > cursor]
+            trades = trades[-limit:]
+            self._trades[symbol] = (trades[-1][0] if len(trades) > 0 else cursor), trades
+            return [t for _, t in trades]
 
         except KeyError:
             return
@@ -97,31 +158,52 @@ class Wrapper(object):
         """
 
         try:
-            req = self._request('api/v1/depth?symbol=' + ''.join(symbol).upper()
-                                + '&limit=100', False)
-            assert req is not None
-
-            asks = {float(p): float(a) for p, a, _ in req['asks']}
-            bids = {float(p): -float(a) for p, a, _ in req['bids']}
-
-            if len(asks) * len(bids) > 0:
-                h_ask = (1 + margin / 100) * min(asks)
-                l_bid = (1 - margin / 100) * max(bids)
-                tmp = {k: v for k, v in asks.items() if k <= h_ask}
-                tmp.update({k: v for k, v in bids.items() if k >= l_bid})
-                return tmp
+            tmp = None
+            if self._depth is not None:
+                tmp = self._depth.book(symbol, margin)
+
+            if tmp is None:
+                limit = [100, 1000][self._depth is not None]
+                req = self._request('api/v1/depth?symbol=' + ''.join(symbol).upper()
+                                    + '&limit={}'.format(limit), False, weight=self._weight('depth', limit))
+                assert req is not None
+
+                if self._depth is not None:
+                    self._depth.seed(symbol, req)
+
+                tmp = ctrl.OrderBook.from_sides(((float(level[0]), float(level[1])) for level in req['asks']),
+                                                ((float(level[0]), float(level[1])) for level in req['bids']))
+                tmp = tmp.window(margin)
+            return tmp
 
         except KeyError:
             return
         except:
             self.log(traceback.format_exc(), self)
 
+    def ticker(self, symbol, depth=3):
+        """
+        Same as 'Toolkit.ticker()' of the book, but (when streaming) computed on the local book itself.
+        """
+
+        try:
+            tmp = None
+            if self._depth is not None:
+                tmp = self._depth.read(symbol, self.Toolkit.ticker, depth)
+
+            if tmp is None:
+                tmp = self.Toolkit.ticker(self.book(symbol, depth), depth)
+            return tmp
+
+        except:
+            self.log(traceback.format_exc(), self)
+
     def balance(self):
         """
         """
 
         try:
-            req = self._request(('api/v3/account', {'method': 'GET'},))
+            req = self._request(('api/v3/account', {'method': 'GET'},), weight=5)
             assert req is not None
 
             tmp = {'btc': (0., 0.)}
@@ -177,22 +259,21 @@ class Wrapper(object):
 
             oid = req['orderId']
             self._orders[oid] = symbol
-            return oid, price
+            self.Toolkit.track(self, oid, (None,), 5.)  # until the site recognizes it...
+            return oid, price, amount
         except:
             self.log(traceback.format_exc(), self)
 
-    def orders(self, delay=5):
+    def orders(self):
         """
         """
 
-        time.sleep(delay)  # to allow the site recognize newly created / canceled orders...
-
         try:
             if len(self._filters) == 0:
                 self.symbols()
 
             translate = {''.join(s).upper(): s for s in self._filters}
-            req = self._request(('api/v3/openOrders', {'method': 'GET'},))
+            req = self._request(('api/v3/openOrders', {'method': 'GET'},), weight=40)
             assert req is not None
 
             tmp = {
@@ -209,6 +290,34 @@ class Wrapper(object):
         except:
             self.log(traceback.format_exc(), self)
 
+    def status(self, order_id):
+        """
+        The (state, executed amount) of an order: its state is 'open', 'partial', 'filled' or 'cancelled'.
+        Straight from the user data stream, if it's enabled (and knows about that order already).
+        """
+
+        try:
+            if self._user is not None:
+                tmp = self._user.status(order_id)
+                if tmp is not None:
+                    return tmp
+
+            params = {
+                'symbol': ''.join(self._orders[order_id]).upper(),
+                'orderId': order_id,
+                'method': 'GET',
+            }
+            req = self._request(('api/v3/order', params,), retry=0, expected=[-2013])
+            assert req is not None
+            assert 'code' not in req  # (-2013) the site doesn't know about it yet: nothing to tell.
+
+            return self.States[req['status']], float(req['executedQty'])
+
+        except (AssertionError, KeyError):
+            return
+        except:
+            self.log(traceback.format_exc(), self)
+
     def cancel(self, order_id):
         """
         """
@@ -222,7 +331,7 @@ class Wrapper(object):
             req = self._request(('api/v3/order', params,))
             assert req is not None
 
-            time.sleep(5)  # to allow the site recognize newly created / canceled orders...
+            self.Toolkit.track(self, order_id)  # until the site really recognizes it...
             return '-' + str(order_id).upper()
 
         except AssertionError:
@@ -230,12 +339,22 @@ class Wrapper(object):
         except:
             self.log(traceback.format_exc(), self)
 
-    def _request(self, req_uri, signing=True, debug=False, retry=3):
+    def _weight(self, endpoint, limit):
+        """
+        Request weights (the cost charged by Binance) for endpoints which depend on the 'limit' parameter.
+        """
+
+        steps = self._weights[endpoint]
+        return [w for l, w in steps if limit <= l][0]
+
+    def _request(self, req_uri, signing=True, debug=False, retry=3, weight=1, expected=()):
         """
+        The error codes in 'expected' are answers (see '_open()'), not failures: neither retried nor logged.
         """
 
         calling = locals()
-        base_uri = 'https://api.binance.com/'
+        endpoint = (req_uri[0] if signing else req_uri).split('?')[0]
+        base_uri = self.BaseURI
         tmp = {}
 
         try:
@@ -243,7 +362,8 @@ class Wrapper(object):
                 self.log('_request(self, req_uri, signing, debug): ' + str(calling), self)
 
             # SECURITY DELAY: in order to NOT get your IP banned!
-            time.sleep(1 / 3)
+            self._limiter.acquire(weight)
+            started = time.time()
 
             if signing:
                 # type(req_uri) == tuple
@@ -257,20 +377,343 @@ class Wrapper(object):
                 query += '&signature={}'.format(sign)
                 params = {'method': method, 'url': base_uri + req_uri[0] + '?' + query,
                           'headers': {'X-MBX-APIKEY': self.Key, }, }
-                tmp = json.loads(request.urlopen(request.Request(**params)).read().decode())
+                tmp = self._open(**params, expected=expected)
             else:
-                # type(req_uri) == str
-                tmp = json.loads(request.urlopen(base_uri + req_uri).read().decode())
+                # type(req_uri) == str (the key is only needed by 'historicalTrades', harmless elsewhere)
+                tmp = self._open(base_uri + req_uri, headers={'X-MBX-APIKEY': self.Key, }, expected=expected)
 
+            self.Toolkit.Metrics.observe('request_seconds', time.time() - started,
+                                         exchange=self.Brand, endpoint=endpoint)
             assert tmp is not None
             return tmp
         except:
             del calling['self']
             if retry > 0:
+                self.Toolkit.Metrics.count('request_retries_total', exchange=self.Brand, endpoint=endpoint)
                 calling['retry'] -= 1
                 self.log('ERROR: retrying {} more time...'.format(retry), self)
                 self.log('(RESPONSE: {})'.format(tmp), self, 0)
                 self.Toolkit.wait()
                 return self._request(**calling)
             else:
+                self.Toolkit.Metrics.count('request_errors_total', exchange=self.Brand, endpoint=endpoint)
+                self.log(traceback.format_exc(), self)
+
+    def _open(self, url, data=None, headers=None, method=None, expected=()):
+        """
+        An error response (HTTP 400) whose code is in 'expected' is returned as it is: {'code': ..., 'msg': ...}.
+        """
+
+        try:
+            body, headers = self.Toolkit.Transport.request(url, data, headers, method)
+            self._limiter.adapt(headers.get('X-MBX-USED-WEIGHT-1M', headers.get('X-MBX-USED-WEIGHT')))
+            return json.loads(body.decode())
+        except error.HTTPError as e:
+            if e.code in [418, 429]:  # too many requests: back off for as long as the site asks
+                self.Toolkit.Metrics.count('throttled_total', exchange=self.Brand)
+                self._limiter.penalize(e.headers.get('Retry-After'))
+            elif e.code == 400 and len(expected) > 0:
+                tmp = json.loads(e.read().decode())
+                if tmp.get('code') in expected:
+                    return tmp
+            raise
+
+
+class Depth(object):
+    """
+    Local order books, kept up to date by the "diff. depth" stream instead of downloading snapshots all the time.
+
+    Reference:
+    https://github.com/binance-exchange/binance-official-api-docs/blob/master/web-socket-streams.md
+    (see "How to manage a local order book correctly")
+    """
+
+    def __init__(self, wrapper, stream_uri, record=None, buffer_size=1000):
+        """
+        Constructor method.
+        """
+
+        self.Wrapper = wrapper
+        self.Brand = self.Wrapper.Brand
+        self.Uri = stream_uri
+        self.Record = record  # a file to keep all the raw messages received (to be replayed later on).
+        self.BufferSize = buffer_size
+
+        self.Toolkit = self.Wrapper.Toolkit
+        self.log = self.Toolkit.log
+
+        self._lock = threading.Lock()
+        self._books, self._socket = {}, None
+        self._pid, self._thread, self._sequence = None, None, 0
+
+    def book(self, symbol, margin=1):
+        """
+        Returns (a copy of) the local book for the symbol, within 'margin' % of the best prices, or None
+        if it is not synchronized yet (e.g. if this is the first time it is asked for).
+        """
+
+        return self.read(symbol, ctrl.OrderBook.window, margin)
+
+    def read(self, symbol, func, *args):
+        """
+        Returns 'func(book, *args)' computed right on the local book (under its lock, nothing copied), or None
+        if it is not synchronized yet: 'func' must neither change the book nor keep it (e.g. 'Toolkit.ticker').
+        """
+
+        key = ''.join(symbol).upper()
+        self._start()
+
+        with self._lock:
+            state = self._books.get(key)
+            if state is None:
+                self._books[key] = {'synced': False, 'last': 0, 'book': ctrl.OrderBook(), 'buffer': []}
+            elif state['synced']:
+                return func(state['book'], *args)
+
+        if state is None:
+            self._subscribe([key])
+
+    def seed(self, symbol, snapshot):
+        """
+        Starts the local book from a REST snapshot, applying the (buffered) updates received since then.
+        """
+
+        key = ''.join(symbol).upper()
+        with self._lock:
+            state = self._books.get(key)
+            if state is None:
+                return
+
+            state['book'] = ctrl.OrderBook.from_sides(
+                ((float(level[0]), float(level[1])) for level in snapshot['asks'] if float(level[1]) > 0),
+                ((float(level[0]), float(level[1])) for level in snapshot['bids'] if float(level[1]) > 0))
+            state['last'], state['synced'] = snapshot['lastUpdateId'], True
+
+            buffer, state['buffer'] = state['buffer'], []
+            for event in buffer:
+                self._apply(state, event)
+
+    def _start(self):
+        """
+        """
+
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._books, self._socket = {}, None  # nothing inherited from a parent process is trustworthy.
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self, backoff=1.):
+        """
+        Reads the stream until halted, reconnecting (and resynchronizing every book) whenever it drops.
+        """
+
+        record = None if self.Record is None else open(self.Record, 'a')  # open as long as the stream is read.
+        try:
+            self._read(record, backoff)
+        finally:
+            if record is not None:
+                record.close()
+
+    def _read(self, record, backoff):
+        """
+        """
+
+        while not self.Toolkit.halt():
+            try:
+                self._socket = netw.WebSocket(self.Uri, timeout=60.).connect()
+                with self._lock:
+                    keys = list(self._books)
+                self._subscribe(keys)
+                backoff = 1.
+
+                while not self.Toolkit.halt():
+                    message = self._socket.recv()
+                    if record is not None:
+                        record.write(message + '\n')
+                    self._handle(json.loads(message))
+
+            except (ConnectionError, OSError, ValueError):
+                self.log('Depth stream lost, reconnecting in {:.0f} s...'.format(backoff), self)
+            except:
+                self.log(traceback.format_exc(), self)
+
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+            with self._lock:
+                for state in self._books.values():
+                    state.update({'synced': False, 'buffer': []})
+
+            self.Toolkit.sleep(backoff)
+            backoff = min(2 * backoff, 60.)
+
+    def _subscribe(self, keys):
+        """
+        """
+
+        try:
+            if self._socket is not None and len(keys) > 0:
+                self._sequence += 1
+                self._socket.send(json.dumps({
+                    'method': 'SUBSCRIBE',
+                    'params': [k.lower() + '@depth@100ms' for k in keys],
+                    'id': self._sequence,
+                }))
+        except (ConnectionError, OSError):
+            pass  # '_run()' subscribes everything again, as soon as it reconnects.
+
+    def _handle(self, message):
+        """
+        """
+
+        event = message.get('data', message)
+        if event.get('e') != 'depthUpdate':
+            return
+
+        with self._lock:
+            state = self._books.get(event['s'])
+            if state is None:
+                return
+
+            if not state['synced']:
+                state['buffer'] = (state['buffer'] + [event])[-self.BufferSize:]
+            else:
+                self._apply(state, event)
+
+    def _apply(self, state, event):
+        """
+        Updates (already locked) are dropped if older than the book, or trigger a new
+        synchronization whenever some of them are missing.
+        """
+
+        if event['u'] <= state['last']:
+            return
+
+        if event['U'] > state['last'] + 1:
+            self.log('Gap found in the depth stream of {}: resynchronizing...'.format(event['s']), self)
+            state.update({'synced': False, 'buffer': [event]})
+            return
+
+        book = state['book']
+        for sign, levels in [(1, event['a']), (-1, event['b'])]:
+            for price, amount in levels:
+                book[float(price)] = sign * float(amount)
+        state['last'] = event['u']
+
+
+class UserData(object):
+    """
+    The state of every order, as soon as it changes, from the "user data" stream (instead of polling for it).
+
+    Reference:
+    https://github.com/binance-exchange/binance-official-api-docs/blob/master/user-data-stream.md
+    """
+
+    def __init__(self, wrapper, stream_uri, keep_alive=1800):
+        """
+        Constructor method.
+        """
+
+        self.Wrapper = wrapper
+        self.Brand = self.Wrapper.Brand
+        self.Uri = stream_uri.rsplit('/', 1)[0] + '/ws/'
+        self.KeepAlive = keep_alive  # seconds, the site closes it after 60 minutes of silence.
+
+        self.Toolkit = self.Wrapper.Toolkit
+        self.log = self.Toolkit.log
+
+        self._lock, self._renewing = threading.Lock(), threading.Lock()
+        self._states, self._socket = {}, None
+        self._pid, self._thread, self._keeper = None, None, None
+        self._key, self._renewed = None, 0
+
+    def status(self, order_id):
+        """
+        Nothing is known about the orders not changed since the stream was (re)connected.
+        """
+
+        self._start()
+        with self._lock:
+            return self._states.get(order_id)
+
+    def _start(self):
+        """
+        """
+
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._states, self._socket, self._key = {}, None, None
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            self._keeper = threading.Thread(target=self._keep, daemon=True)
+            self._keeper.start()
+
+    def _run(self, backoff=1.):
+        """
+        Reads the stream until halted, reconnecting (and forgetting every state) whenever it drops.
+        """
+
+        while not self.Toolkit.halt():
+            try:
+                self._listen()
+                self._socket = netw.WebSocket(self.Uri + self._key, timeout=200.).connect()  # pings every 3 min.
+                backoff = 1.
+
+                while not self.Toolkit.halt():
+                    self._handle(json.loads(self._socket.recv()))
+
+            except (ConnectionError, OSError, ValueError):
+                self.log('User data stream lost, reconnecting in {:.0f} s...'.format(backoff), self)
+            except:
+                self.log(traceback.format_exc(), self)
+
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+            with self._lock:
+                self._states = {}
+
+            self.Toolkit.sleep(backoff)
+            backoff = min(2 * backoff, 60.)
+
+    def _keep(self, interval=60.):
+        """
+        Renews the listen key on a timer: an idle account gets only pings (answered inside 'recv()'), so the
+        reading loop alone would never get the chance to, and the site would silently close the stream.
+        """
+
+        while not self.Toolkit.sleep(interval):
+            try:
+                if self._key is not None and time.time() - self._renewed > self.KeepAlive:
+                    self._listen()
+            except:
                 self.log(traceback.format_exc(), self)
+
+    def _listen(self):
+        """
+        Creates the "listen key" (or keeps the current one alive, which renews it for 60 more minutes).
+        """
+
+        url = self.Wrapper.BaseURI + 'api/v1/userDataStream'
+        headers = {'X-MBX-APIKEY': self.Wrapper.Key, }
+
+        with self._renewing:  # both the reading loop (reconnecting) and the keeper may get here.
+            self.Wrapper._limiter.acquire(1)
+            if self._key is None or time.time() - self._renewed > 2 * self.KeepAlive:
+                self._key = self.Wrapper._open(url, b'', headers, 'POST')['listenKey']
+            else:
+                self.Wrapper._open(url + '?' + parse.urlencode({'listenKey': self._key}), b'', headers, 'PUT')
+            self._renewed = time.time()
+
+    def _handle(self, message):
+        """
+        """
+
+        if message.get('e') == 'executionReport':
+            with self._lock:
+                self._states[message['i']] = self.Wrapper.States[message['X']], float(message['z'])
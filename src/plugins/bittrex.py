@@ -5,7 +5,9 @@ import time
 import traceback
 
 from calendar import timegm
-from urllib import parse, request
+from urllib import error, parse
+
+from ..functions import ctrl, netw
 
 
 class Wrapper(object):
@@ -25,6 +27,11 @@ class Wrapper(object):
         self.Toolkit = toolkit
         self.Key, self.Secret = self.Toolkit.setup(self.Brand)
         self.log = self.Toolkit.log
+        self.BaseURI = self.Toolkit.setup(self.Brand, 'base_uri', 'https://bittrex.com/api/v1.1/')
+        self._limiter = netw.Limiter(
+            float(self.Toolkit.setup(self.Brand, 'rate_limit', 3)),
+            float(self.Toolkit.setup(self.Brand, 'rate_period', 1)))
+        self._trades = {}
 
     def symbols(self, btc_only=True):
         """
@@ -58,20 +65,46 @@ class Wrapper(object):
         except:
             self.log(traceback.format_exc(), self)
 
+    def summaries(self, btc_only=True):
+        """
+        """
+
+        try:
+            req = self._request('public/getmarketsummaries', False)
+            assert req['success']
+
+            tmp = {d['MarketName'].lower().partition('-')[::-2]: (d['Ask'], d['Bid'], d['BaseVolume'], None)
+                   for d in req['result'] if None not in [d['Ask'], d['Bid'], d['BaseVolume']]}
+
+            if btc_only:
+                return {s: v for s, v in tmp.items() if s[1] == 'btc'}
+            return tmp
+        except:
+            self.log(traceback.format_exc(), self)
+
     def history(self, symbol, limit=100):
         """
+        The site has no way to ask for the trades after a given one, so the latest ones are always
+        downloaded: at least, just the ones newer than the last seen for 'symbol' are parsed.
         """
 
         try:
+            cursor, trades = self._trades.get(symbol, (None, []))
             params = {'market': '-'.join(symbol[::-1]), }
             req = self._request('public/getmarkethistory?' + parse.urlencode(params), False)
             assert req['success']
 
-            tmp = [(timegm(time.strptime(d['TimeStamp'][:19], self.fmt)),
-                    [-1, 1][d['OrderType'] == 'BUY'] * d['Quantity'],
-                    d['Price']) for d in req['result']]
+            if cursor is not None and len(req['result']) > 0 and all(d['Id'] > cursor for d in req['result']):
+                trades = []  # too many new trades: there is a gap, so start over.
+
+            tmp = [(d['Id'], (timegm(time.strptime(d['TimeStamp'][:19], self.fmt)),
+                              [-1, 1][d['OrderType'] == 'BUY'] * d['Quantity'],
+                              d['Price'])) for d in req['result'] if cursor is None or d['Id'] > cursor]
             tmp.reverse()
-            return tmp[-limit:]
+            trades = (trades + tmp)[-limit:]
+            if len(trades) > 0:
+                self._trades[symbol] = trades[-1][0], trades
+            return [t for _, t in trades]
 
         except KeyError:
             return
@@ -88,15 +121,9 @@ class Wrapper(object):
             assert req['success']
 
             if None not in req['result'].values():
-                asks = {d['Rate']: d['Quantity'] for d in req['result']['sell']}
-                bids = {d['Rate']: -d['Quantity'] for d in req['result']['buy']}
-
-                if len(asks) * len(bids) > 0:
-                    h_ask = (1 + margin / 100) * min(asks)
-                    l_bid = (1 - margin / 100) * max(bids)
-                    tmp = {k: v for k, v in asks.items() if k <= h_ask}
-                    tmp.update({k: v for k, v in bids.items() if k >= l_bid})
-                    return tmp
+                tmp = ctrl.OrderBook.from_sides(((d['Rate'], d['Quantity']) for d in req['result']['sell']),
+                                                ((d['Rate'], d['Quantity']) for d in req['result']['buy']))
+                return tmp.window(margin)
 
         except KeyError:
             return
@@ -142,16 +169,15 @@ class Wrapper(object):
             req = self._request((uri, tmp,))
             assert req['success']
 
-            return req['result']['uuid'], tmp['rate']
+            self.Toolkit.track(self, req['result']['uuid'], (None,), 5.)  # until the site recognizes it...
+            return req['result']['uuid'], tmp['rate'], [-1, 1][amount > 0] * tmp['quantity']
         except:
             self.log(traceback.format_exc(), self)
 
-    def orders(self, delay=5):
+    def orders(self):
         """
         """
 
-        time.sleep(delay)  # to allow the site recognize newly created / canceled orders...
-
         try:
             req = self._request(('market/getopenorders?', {},))
             assert req['success']
@@ -167,6 +193,26 @@ class Wrapper(object):
         except:
             self.log(traceback.format_exc(), self)
 
+    def status(self, order_id):
+        """
+        The (state, executed amount) of an order: its state is 'open', 'partial', 'filled' or 'cancelled'.
+        """
+
+        try:
+            req = self._request(('account/getorder?', {'uuid': order_id, },), retry=0)
+            assert req['success']
+
+            d = req['result']
+            executed = d['Quantity'] - d['QuantityRemaining']
+            if d['IsOpen']:
+                return ['partial', 'open'][executed == 0], executed
+            return ['cancelled', 'filled'][d['QuantityRemaining'] == 0], executed
+
+        except (AssertionError, KeyError, TypeError):
+            return
+        except:
+            self.log(traceback.format_exc(), self)
+
     def cancel(self, order_id):
         """
         """
@@ -175,7 +221,7 @@ class Wrapper(object):
             req = self._request(('market/cancel?', {'uuid': order_id, },))
             assert req['success']
 
-            time.sleep(7)  # to allow the site recognize newly created / canceled orders...
+            self.Toolkit.track(self, order_id)  # until the site really recognizes it...
             return '-' + order_id.upper()
 
         except AssertionError:
@@ -183,12 +229,13 @@ class Wrapper(object):
         except:
             self.log(traceback.format_exc(), self)
 
-    def _request(self, req_uri, signing=True, debug=False, retry=3):
+    def _request(self, req_uri, signing=True, debug=False, retry=3, weight=1):
         """
         """
 
         calling = locals()
-        base_uri = 'https://bittrex.com/api/v1.1/'
+        endpoint = (req_uri[0] if signing else req_uri).split('?')[0]
+        base_uri = self.BaseURI
         tmp = {}
 
         try:
@@ -196,7 +243,8 @@ class Wrapper(object):
                 self.log('_request(self, req_uri, signing, debug): ' + str(calling), self)
 
             # SECURITY DELAY: in order to NOT get your IP banned!
-            time.sleep(1 / 3)
+            self._limiter.acquire(weight)
+            started = time.time()
 
             if signing:
                 # type(req_uri) == tuple
@@ -206,20 +254,37 @@ class Wrapper(object):
 
                 sign = hmac.new(self.Secret, post_data, digestmod=hashlib.sha512).hexdigest()
                 params = {'url': url, 'headers': {'apisign': sign, }, }
-                tmp = json.loads(request.urlopen(request.Request(**params)).read().decode())
+                tmp = self._open(**params)
             else:
                 # type(req_uri) == str
-                tmp = json.loads(request.urlopen(base_uri + req_uri).read().decode())
+                tmp = self._open(base_uri + req_uri)
 
+            self.Toolkit.Metrics.observe('request_seconds', time.time() - started,
+                                         exchange=self.Brand, endpoint=endpoint)
             assert tmp['success']
             return tmp
         except:
             del calling['self']
             if retry > 0:
+                self.Toolkit.Metrics.count('request_retries_total', exchange=self.Brand, endpoint=endpoint)
                 calling['retry'] -= 1
                 self.log('ERROR: retrying {} more time...'.format(retry), self)
                 self.log('(RESPONSE: {})'.format(tmp), self, 0)
                 self.Toolkit.wait()
                 return self._request(**calling)
             else:
+                self.Toolkit.Metrics.count('request_errors_total', exchange=self.Brand, endpoint=endpoint)
                 self.log(traceback.format_exc(), self)
+
+    def _open(self, url, data=None, headers=None, method=None):
+        """
+        """
+
+        try:
+            body, _ = self.Toolkit.Transport.request(url, data, headers, method)
+            return json.loads(body.decode())
+        except error.HTTPError as e:
+            if e.code in [418, 429]:  # too many requests: back off for as long as the site asks
+                self.Toolkit.Metrics.count('throttled_total', exchange=self.Brand)
+                self._limiter.penalize(e.headers.get('Retry-After'))
+            raise
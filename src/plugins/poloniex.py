@@ -5,7 +5,9 @@ import time
 import traceback
 
 from calendar import timegm
-from urllib import parse, request
+from urllib import error, parse
+
+from ..functions import ctrl, netw
 
 
 class Wrapper(object):
@@ -25,6 +27,11 @@ class Wrapper(object):
         self.Toolkit = toolkit
         self.Key, self.Secret = self.Toolkit.setup(self.Brand)
         self.log = self.Toolkit.log
+        self.BaseURI = self.Toolkit.setup(self.Brand, 'base_uri', 'https://poloniex.com/')
+        self._limiter = netw.Limiter(
+            float(self.Toolkit.setup(self.Brand, 'rate_limit', 6)),
+            float(self.Toolkit.setup(self.Brand, 'rate_period', 1)))
+        self._trades, self._amounts = {}, {}
 
     def symbols(self, btc_only=True):
         """
@@ -60,20 +67,50 @@ class Wrapper(object):
         except:
             self.log(traceback.format_exc(), self)
 
+    def summaries(self, btc_only=True):
+        """
+        """
+
+        try:
+            req = self._request('public?command=returnTicker', False)
+            assert req is not None
+
+            tmp = {key.lower().partition('_')[::-2]: (float(d['lowestAsk']), float(d['highestBid']),
+                                                      float(d['baseVolume']), None)
+                   for key, d in req.items() if int(d['isFrozen']) == 0}
+
+            if btc_only:
+                return {s: v for s, v in tmp.items() if s[1] == 'btc'}
+            return tmp
+        except:
+            self.log(traceback.format_exc(), self)
+
     def history(self, symbol, limit=100):
         """
+        Only the trades since the last one seen for 'symbol' are downloaded (its second included, so the
+        overlap is dropped by trade id), unless that was more than an hour ago: then the latest ones are.
         """
 
         try:
-            req = self._request('public?command=returnTradeHistory&currencyPair='
-                                + '_'.join(symbol[::-1]).upper(), False)
+            (cursor, stamp), trades = self._trades.get(symbol, ((None, None), []))
+            req_uri = 'public?command=returnTradeHistory&currencyPair=' + '_'.join(symbol[::-1]).upper()
+            now = int(time.time())
+            if stamp is not None and now - stamp < 3600:
+                req_uri += '&start={0}&end={1}'.format(stamp, now)
+            else:
+                cursor, trades = None, []
+
+            req = self._request(req_uri, False)
             assert req is not None
 
-            tmp = [(timegm(time.strptime(d['date'], self.fmt)),
-                    [-1, 1][d['type'] == 'buy'] * float(d['amount']),
-                    float(d['rate'])) for d in req]
+            tmp = [(d['tradeID'], (timegm(time.strptime(d['date'], self.fmt)),
+                                   [-1, 1][d['type'] == 'buy'] * float(d['amount']),
+                                   float(d['rate']))) for d in req if cursor is None or d['tradeID'] > cursor]
             tmp.reverse()
-            return tmp[-limit:]
+            trades = (trades + tmp)[-limit:]
+            if len(trades) > 0:
+                self._trades[symbol] = (trades[-1][0], trades[-1][1][0]), trades
+            return [t for _, t in trades]
 
         except KeyError:
             return
@@ -89,15 +126,9 @@ class Wrapper(object):
                                 '_'.join(symbol[::-1]).upper() + '&depth=100', False)
             assert req is not None
 
-            asks = {float(p): a for p, a in req['asks']}
-            bids = {float(p): -a for p, a in req['bids']}
-
-            if len(asks) * len(bids) > 0:
-                h_ask = (1 + margin / 100) * min(asks)
-                l_bid = (1 - margin / 100) * max(bids)
-                tmp = {k: v for k, v in asks.items() if k <= h_ask}
-                tmp.update({k: v for k, v in bids.items() if k >= l_bid})
-                return tmp
+            tmp = ctrl.OrderBook.from_sides(((float(p), a) for p, a in req['asks']),
+                                            ((float(p), a) for p, a in req['bids']))
+            return tmp.window(margin)
 
         except KeyError:
             return
@@ -141,22 +172,22 @@ class Wrapper(object):
             req = self._request(('tradingApi', tmp,))
             assert req is not None
 
-            return int(req['orderNumber']), tmp['rate']
+            self._amounts[int(req['orderNumber'])] = tmp['amount']
+            self.Toolkit.track(self, int(req['orderNumber']), (None,), 5.)  # until the site recognizes it...
+            return int(req['orderNumber']), tmp['rate'], [-1, 1][amount > 0] * tmp['amount']
         except:
             self.log(traceback.format_exc(), self)
 
-    def orders(self, delay=5):
+    def orders(self):
         """
         """
 
-        time.sleep(delay)  # to allow the site recognize newly created / canceled orders...
-
         try:
             req = self._request(('tradingApi', {
                 'command': 'returnOpenOrders', 'currencyPair': 'all'},))
             assert req is not None
 
-            return {
+            tmp = {
                 int(d['orderNumber']): (
                     [-1, 1][d['type'] == 'buy'] * float(d['amount']),
                     float(d['rate']),
@@ -165,6 +196,44 @@ class Wrapper(object):
                 for pair_str, orders_list in req.items()
                 for d in orders_list if len(orders_list) > 0
             }
+
+            self._amounts.update({int(d['orderNumber']): float(d['startingAmount'])
+                                  for orders_list in req.values() for d in orders_list if 'startingAmount' in d})
+            return tmp
+        except:
+            self.log(traceback.format_exc(), self)
+
+    def status(self, order_id):
+        """
+        The (state, executed amount) of an order: its state is 'open', 'partial', 'filled' or 'cancelled'.
+        Closed orders are not reported by the site anymore, so their trades (against the original amount,
+        known since 'fire()' or 'orders()') tell which was the case.
+        """
+
+        try:
+            req = self._request(('tradingApi', {
+                'command': 'returnOrderStatus', 'orderNumber': order_id, },), retry=0)
+            assert req is not None
+
+            if req.get('success') == 1:
+                d = req['result'][str(order_id)]
+                self._amounts[order_id] = float(d['startingAmount'])
+                executed = self._amounts[order_id] - float(d['amount'])
+                return ['partial', 'open'][d['status'] == 'Open'], executed
+
+            req = self._request(('tradingApi', {
+                'command': 'returnOrderTrades', 'orderNumber': order_id, },), retry=0)
+            assert req is not None
+
+            if isinstance(req, dict) or len(req) == 0:  # {'error': ...} means no trades at all
+                return 'cancelled', 0.
+
+            executed = sum(float(d['amount']) for d in req)
+            assert order_id in self._amounts  # partially filled or not, no way to tell.
+            return ['cancelled', 'filled'][executed >= self._amounts[order_id] - 1E-8], executed
+
+        except (AssertionError, KeyError, TypeError):
+            return
         except:
             self.log(traceback.format_exc(), self)
 
@@ -177,7 +246,7 @@ class Wrapper(object):
                 'command': 'cancelOrder', 'orderNumber': order_id, },))
             assert req is not None
 
-            time.sleep(5)  # to allow the site recognize newly created / canceled orders...
+            self.Toolkit.track(self, order_id)  # until the site really recognizes it...
             return -order_id
 
         except AssertionError:
@@ -185,12 +254,13 @@ class Wrapper(object):
         except:
             self.log(traceback.format_exc(), self)
 
-    def _request(self, req_uri, signing=True, debug=False, retry=3):
+    def _request(self, req_uri, signing=True, debug=False, retry=3, weight=1):
         """
         """
 
         calling = locals()
-        base_uri = 'https://poloniex.com/'
+        endpoint = req_uri[1]['command'] if signing else dict(parse.parse_qsl(req_uri.split('?')[-1]))['command']
+        base_uri = self.BaseURI
         tmp = {}
 
         try:
@@ -198,7 +268,8 @@ class Wrapper(object):
                 self.log('_request(self, req_uri, signing, debug): ' + str(calling), self)
 
             # SECURITY DELAY: in order to NOT get your IP banned!
-            time.sleep(1 / 3)
+            self._limiter.acquire(weight)
+            started = time.time()
 
             if signing:
                 # type(req_uri) == tuple
@@ -208,20 +279,37 @@ class Wrapper(object):
                 sign = hmac.new(self.Secret, post_data, digestmod=hashlib.sha512).hexdigest()
                 params = {'url': base_uri + req_uri[0], 'data': post_data,
                           'headers': {'Key': self.Key, 'Sign': sign, }, }
-                tmp = json.loads(request.urlopen(request.Request(**params)).read().decode())
+                tmp = self._open(**params)
             else:
                 # type(req_uri) == str
-                tmp = json.loads(request.urlopen(base_uri + req_uri).read().decode())
+                tmp = self._open(base_uri + req_uri)
 
+            self.Toolkit.Metrics.observe('request_seconds', time.time() - started,
+                                         exchange=self.Brand, endpoint=endpoint)
             assert tmp is not None
             return tmp
         except:
             del calling['self']
             if retry > 0:
+                self.Toolkit.Metrics.count('request_retries_total', exchange=self.Brand, endpoint=endpoint)
                 calling['retry'] -= 1
                 self.log('ERROR: retrying {} more time...'.format(retry), self)
                 self.log('(RESPONSE: {})'.format(tmp), self, 0)
                 self.Toolkit.wait()
                 return self._request(**calling)
             else:
+                self.Toolkit.Metrics.count('request_errors_total', exchange=self.Brand, endpoint=endpoint)
                 self.log(traceback.format_exc(), self)
+
+    def _open(self, url, data=None, headers=None, method=None):
+        """
+        """
+
+        try:
+            body, _ = self.Toolkit.Transport.request(url, data, headers, method)
+            return json.loads(body.decode())
+        except error.HTTPError as e:
+            if e.code in [418, 429]:  # too many requests: back off for as long as the site asks
+                self.Toolkit.Metrics.count('throttled_total', exchange=self.Brand)
+                self._limiter.penalize(e.headers.get('Retry-After'))
+            raise